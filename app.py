@@ -4,31 +4,152 @@ FastAPI application with WebSocket support for real-time voice streaming
 """
 
 from fastapi import FastAPI, WebSocket, Request, WebSocketDisconnect, HTTPException
-from fastapi.responses import Response, JSONResponse
+from fastapi.responses import Response, JSONResponse, ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.websockets import WebSocketState
 from contextlib import asynccontextmanager
-import json
+import orjson
 import asyncio
+import base64
 import os
+import re
+import time
 from datetime import datetime
-from typing import Dict, Optional, Any
-import traceback
+from typing import Dict, List, Optional
+from pydantic import ValidationError
+from websockets.exceptions import ConnectionClosed
+from urllib.parse import parse_qsl
+from xml.sax.saxutils import escape
 
 # Application imports
-from config.settings import settings
+from config.settings import get_settings
 from config.agent_config import AGENT_CONFIG, AUDIO_CONFIG
 from services.openai_service import OpenAIService
-from services.twilio_service import TwilioService
+from services.twilio_service import TwilioService, CONNECT_TWIML_TEMPLATE, XML_ATTR_ENTITIES
 from services.database_service import DatabaseService
-from models.call_session import CallSession, CallStatus, CallDirection, OutboundCallRequest
+from models.call_session import (
+    CallSession, OutboundCallRequest, SessionState,
+    LookupOrderArgs, TransferToHumanArgs, CheckProductAvailabilityArgs, CreateTicketArgs
+)
 from utils.logger import setup_logger, get_call_logger
 from utils.helpers import sanitize_phone_number, generate_session_id, estimate_call_cost
 
+# The server needs every setting, so read and validate them up front
+settings = get_settings()
+
 # Setup logger
 logger = setup_logger("voice_agent", level=settings.LOG_LEVEL)
 
+# Twilio media frames start with the event key; the payload can be sliced out
+# without building a dict. Anything else falls back to a full parse.
+# Parsed event types are fresh strings from orjson, so they are dispatched by
+# dict lookup rather than `is` checks against interned constants.
+TWILIO_MEDIA_PREFIX = '{"event":"media"'
+TWILIO_PAYLOAD_RE = re.compile(r'"payload":"([^"]+)"')
+
+# OpenAI audio deltas are relayed the same way; escaped deltas fall back to a full parse
+OPENAI_AUDIO_DELTA_PREFIX = b'{"type":"response.audio.delta"'
+OPENAI_DELTA_RE = re.compile(rb'"delta":"([^"\\]+)"')
+
+# Outbound media envelope: HEAD + json(streamSid) + BODY + payload + SUFFIX
+TWILIO_MEDIA_HEAD = '{"event":"media","streamSid":'
+TWILIO_MEDIA_BODY = ',"media":{"payload":"'
+TWILIO_MEDIA_SUFFIX = '"}}'
+
+# Outbound audio is queued per call and merged into fewer Twilio frames
+OUTBOUND_QUEUE_SIZE = 256
+OUTBOUND_BATCH_SIZE = 8
+
+# Inbound audio goes to OpenAI in ~60 ms appends instead of one per 20 ms Twilio frame.
+# Twilio's base64 payloads are padded, so they are decoded and re-encoded rather than joined.
+INBOUND_AUDIO_BATCH_BYTES = AUDIO_CONFIG["sample_rate"] * 60 // 1000  # g711_ulaw is one byte per sample
+
 # Active sessions storage
-active_sessions: Dict[str, Dict[str, Any]] = {}
+active_sessions: Dict[str, SessionState] = {}
+
+# Bounds concurrent WebSocket accepts + OpenAI session setup during call bursts
+handshake_semaphore = asyncio.Semaphore(settings.MAX_CONCURRENT_HANDSHAKES)
+
+# Sessions whose OpenAI connection closed without cleanup running are reaped periodically
+SESSION_REAP_INTERVAL = 60
+session_reaper = None
+
+BUSY_TWIML = '<?xml version="1.0" encoding="UTF-8"?><Response><Reject reason="busy"/></Response>'
+
+# The stream URL is fixed per deployment, so only the call parameters vary in the connect TwiML;
+# fill the URL into TwilioService's template once and split it around the call parameters
+CONNECT_TWIML_PREFIX, CONNECT_TWIML_MIDDLE, CONNECT_TWIML_SUFFIX = (
+    part.encode() for part in CONNECT_TWIML_TEMPLATE.format(
+        url=escape(f"wss://{settings.SERVER_URL}/media-stream", XML_ATTR_ENTITIES),
+        call_sid="\0",
+        from_number="\0"
+    ).split("\0")
+)
+
+
+def build_connect_twiml(call_sid: Optional[str], from_number: Optional[str]) -> bytes:
+    """
+    Build TwiML connecting the call to the media stream
+    
+    Args:
+        call_sid: Twilio Call SID
+        from_number: Caller's phone number
+        
+    Returns:
+        TwiML XML bytes
+    """
+    return b"".join((
+        CONNECT_TWIML_PREFIX,
+        escape(call_sid or "", XML_ATTR_ENTITIES).encode(),
+        CONNECT_TWIML_MIDDLE,
+        escape(from_number or "", XML_ATTR_ENTITIES).encode(),
+        CONNECT_TWIML_SUFFIX
+    ))
+
+
+def merge_audio_payloads(first: str, queue: asyncio.Queue) -> List[str]:
+    """
+    Take queued audio deltas that can be joined onto the first one
+    
+    Args:
+        first: Base64 payload already taken from the queue
+        queue: Outbound audio queue for the call
+        
+    Returns:
+        Up to OUTBOUND_BATCH_SIZE payloads whose concatenation is valid base64
+    """
+    payloads = [first]
+    
+    # Base64 chunks can only be joined while none of them is padded
+    while (
+        len(payloads) < OUTBOUND_BATCH_SIZE
+        and not payloads[-1].endswith("=")
+        and not queue.empty()
+    ):
+        payloads.append(queue.get_nowait())
+    
+    return payloads
+
+
+def buffer_inbound_audio(buffer: bytearray, audio_payload: str) -> Optional[str]:
+    """
+    Add a Twilio media payload to the inbound buffer, returning a batch once it is full
+    
+    Args:
+        buffer: Decoded caller audio not yet sent to OpenAI (cleared when a batch is returned)
+        audio_payload: Base64 g711_ulaw payload from a Twilio media event
+        
+    Returns:
+        Base64 audio for one OpenAI append, or None while still buffering
+    """
+    buffer.extend(base64.b64decode(audio_payload))
+    
+    if len(buffer) < INBOUND_AUDIO_BATCH_BYTES:
+        return None
+    
+    batch = base64.b64encode(buffer).decode()
+    buffer.clear()
+    return batch
 
 # Initialize services (will be set in lifespan)
 openai_service = None
@@ -39,7 +160,7 @@ db_service = None
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan manager"""
-    global openai_service, twilio_service, db_service
+    global openai_service, twilio_service, db_service, session_reaper
     
     # Startup
     logger.info("=" * 50)
@@ -57,20 +178,26 @@ async def lifespan(app: FastAPI):
         phone_number=settings.TWILIO_PHONE_NUMBER
     )
     db_service = DatabaseService()
+    await db_service.connect()
+    session_reaper = asyncio.create_task(reap_stale_sessions())
     
     yield
     
     # Shutdown
     logger.info("Shutting down application...")
     
+    if session_reaper:
+        session_reaper.cancel()
+        await asyncio.gather(session_reaper, return_exceptions=True)
+    
     # Close all active sessions
-    for call_sid in list(active_sessions.keys()):
+    for call_sid in tuple(active_sessions):
         try:
             await cleanup_session(call_sid)
         except Exception as e:
             logger.error(f"Error cleaning up session {call_sid}: {e}")
     
-    # Close database connections
+    # Flush queued conversation items and close database connections
     if db_service:
         await db_service.close()
     
@@ -82,7 +209,8 @@ app = FastAPI(
     title="AI Voice Customer Service Agent",
     description="Real-time speech-to-speech AI agent with Hinglish support",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 # CORS middleware
@@ -109,7 +237,7 @@ async def root():
 @app.get("/health")
 async def health_check():
     """Detailed health check"""
-    active_calls = await db_service.get_active_calls_count()
+    active_calls = db_service.active_calls_count
     
     return {
         "status": "healthy",
@@ -121,6 +249,22 @@ async def health_check():
     }
 
 
+async def read_form_fields(request: Request) -> Dict[str, str]:
+    """
+    Decode a Twilio x-www-form-urlencoded webhook body
+    
+    Skips Starlette's form/multipart machinery for these small, flat bodies.
+    
+    Args:
+        request: Incoming webhook request
+        
+    Returns:
+        Form fields
+    """
+    body = await request.body()
+    return dict(parse_qsl(body.decode(), max_num_fields=100))
+
+
 @app.post("/incoming-call")
 async def handle_incoming_call(request: Request):
     """
@@ -128,7 +272,7 @@ async def handle_incoming_call(request: Request):
     Returns TwiML to connect call to WebSocket
     """
     try:
-        form_data = await request.form()
+        form_data = await read_form_fields(request)
         call_sid = form_data.get("CallSid")
         from_number = form_data.get("From")
         to_number = form_data.get("To")
@@ -136,23 +280,20 @@ async def handle_incoming_call(request: Request):
         
         logger.info(f"Incoming call: {call_sid} from {from_number} (status: {call_status})")
         
-        # Generate WebSocket stream URL
-        stream_url = f"wss://{settings.SERVER_URL}/media-stream"
+        # Reject when at capacity
+        if len(active_sessions) >= settings.MAX_ACTIVE_SESSIONS:
+            logger.warning(f"Rejecting call {call_sid}: {len(active_sessions)} active sessions")
+            return Response(content=BUSY_TWIML, media_type="application/xml")
         
         # Generate TwiML
-        twiml = twilio_service.generate_connect_twiml(
-            stream_url=stream_url,
-            call_sid=call_sid,
-            from_number=from_number
-        )
+        twiml = build_connect_twiml(call_sid, from_number)
         
         logger.info(f"TwiML generated for call {call_sid}")
         
         return Response(content=twiml, media_type="application/xml")
     
     except Exception as e:
-        logger.error(f"Error handling incoming call: {e}")
-        logger.error(traceback.format_exc())
+        logger.exception(f"Error handling incoming call: {e}")
         
         # Return error TwiML
         error_twiml = '<?xml version="1.0" encoding="UTF-8"?><Response><Say>We are experiencing technical difficulties. Please try again later.</Say></Response>'
@@ -164,86 +305,120 @@ async def media_stream_handler(websocket: WebSocket):
     """
     Handle bidirectional audio streaming between Twilio and OpenAI
     """
-    await websocket.accept()
-    
     call_sid = None
     stream_sid = None
+    media_prefix = None
     openai_ws = None
     call_logger = None
-    
-    logger.info("WebSocket connection established")
+    sender_task = None
+    outbound_queue: asyncio.Queue = asyncio.Queue(maxsize=OUTBOUND_QUEUE_SIZE)
+    inbound_audio = bytearray()
     
     try:
-        # Create OpenAI session
-        session_id = generate_session_id()
-        openai_ws = await openai_service.create_session(session_id)
+        # Only the handshake is bounded, not the session lifetime
+        async with handshake_semaphore:
+            await websocket.accept()
+            logger.info("WebSocket connection established")
+            
+            # Create OpenAI session
+            session_id = generate_session_id()
+            openai_ws = await openai_service.create_session(session_id)
         
         logger.info(f"OpenAI session created: {session_id}")
         
         # Send initial greeting
         await openai_service.send_initial_greeting(openai_ws)
         
+        # Twilio stream event handlers; returning True ends the stream
+        async def on_twilio_start(data: dict):
+            """Call started"""
+            nonlocal call_sid, stream_sid, media_prefix, call_logger
+            
+            start_data = data.get("start", {})
+            call_sid = start_data.get("callSid")
+            stream_sid = start_data.get("streamSid")
+            
+            # Outbound media frames only differ in payload
+            media_prefix = TWILIO_MEDIA_HEAD + orjson.dumps(stream_sid).decode() + TWILIO_MEDIA_BODY
+            
+            # Setup call logger
+            call_logger = get_call_logger(call_sid)
+            call_logger.info("Call started")
+            
+            # Extract call details
+            custom_params = start_data.get("customParameters", {})
+            from_number = custom_params.get("from", "")
+            
+            # Create session record
+            active_sessions[call_sid] = SessionState(
+                call_sid=call_sid,
+                stream_sid=stream_sid,
+                openai_session_id=session_id,
+                openai_ws=openai_ws,
+                start_time_ns=time.monotonic_ns(),
+                from_number=from_number,
+                outbound_queue=outbound_queue
+            )
+            
+            # Create database record
+            await db_service.create_call_record(call_sid, start_data)
+            
+            call_logger.info(f"Session initialized - Stream: {stream_sid}")
+        
+        async def forward_audio(audio_payload: str):
+            """Buffer caller audio and forward it to OpenAI once a batch has built up"""
+            batch = buffer_inbound_audio(inbound_audio, audio_payload)
+            
+            if batch:
+                await openai_service.send_audio(openai_ws, batch)
+        
+        async def on_twilio_media(data: dict):
+            """Audio data from Twilio"""
+            audio_payload = data.get("media", {}).get("payload")
+            
+            if audio_payload and openai_ws:
+                # Forward to OpenAI
+                await forward_audio(audio_payload)
+        
+        async def on_twilio_mark(data: dict):
+            """Mark event (for synchronization)"""
+            if call_logger:
+                call_logger.debug(f"Mark event: {data.get('mark', {}).get('name')}")
+        
+        async def on_twilio_stop(data: dict) -> bool:
+            """Call ended"""
+            if call_logger:
+                call_logger.info("Call ended by Twilio")
+            
+            # Update database
+            if call_sid:
+                await db_service.end_call_record(call_sid)
+            
+            return True
+        
+        twilio_handlers = {
+            "media": on_twilio_media,
+            "start": on_twilio_start,
+            "mark": on_twilio_mark,
+            "stop": on_twilio_stop
+        }
+        
         async def twilio_to_openai():
             """Forward audio from Twilio to OpenAI"""
-            nonlocal call_sid, stream_sid, call_logger
-            
             try:
                 async for message in websocket.iter_text():
-                    data = json.loads(message)
-                    event_type = data.get("event")
-                    
-                    if event_type == "start":
-                        # Call started
-                        start_data = data.get("start", {})
-                        call_sid = start_data.get("callSid")
-                        stream_sid = start_data.get("streamSid")
-                        
-                        # Setup call logger
-                        call_logger = get_call_logger(call_sid)
-                        call_logger.info("Call started")
-                        
-                        # Extract call details
-                        custom_params = start_data.get("customParameters", {})
-                        from_number = custom_params.get("from", "")
-                        
-                        # Create session record
-                        active_sessions[call_sid] = {
-                            "call_sid": call_sid,
-                            "stream_sid": stream_sid,
-                            "openai_session_id": session_id,
-                            "openai_ws": openai_ws,
-                            "start_time": datetime.utcnow(),
-                            "from_number": from_number
-                        }
-                        
-                        # Create database record
-                        await db_service.create_call_record(call_sid, start_data)
-                        
-                        call_logger.info(f"Session initialized - Stream: {stream_sid}")
-                    
-                    elif event_type == "media":
-                        # Audio data from Twilio
-                        media_data = data.get("media", {})
-                        audio_payload = media_data.get("payload")
-                        
-                        if audio_payload and openai_ws:
-                            # Forward to OpenAI
-                            await openai_service.send_audio(openai_ws, audio_payload)
+                    # Fast path: forward media payloads without parsing the frame
+                    if message.startswith(TWILIO_MEDIA_PREFIX):
+                        match = TWILIO_PAYLOAD_RE.search(message)
+                        if match:
+                            if openai_ws:
+                                await forward_audio(match.group(1))
+                            continue
                     
-                    elif event_type == "mark":
-                        # Mark event (for synchronization)
-                        if call_logger:
-                            call_logger.debug(f"Mark event: {data.get('mark', {}).get('name')}")
+                    data = orjson.loads(message)
+                    handler = twilio_handlers.get(data.get("event"))
                     
-                    elif event_type == "stop":
-                        # Call ended
-                        if call_logger:
-                            call_logger.info("Call ended by Twilio")
-                        
-                        # Update database
-                        if call_sid:
-                            await db_service.end_call_record(call_sid)
-                        
+                    if handler is not None and await handler(data):
                         break
             
             except WebSocketDisconnect:
@@ -253,146 +428,198 @@ async def media_stream_handler(websocket: WebSocket):
                     logger.warning(f"Twilio WebSocket disconnected: {call_sid}")
             
             except Exception as e:
-                if call_logger:
-                    call_logger.error(f"Error in twilio_to_openai: {e}")
-                    call_logger.error(traceback.format_exc())
+                # openai_to_twilio closes the Twilio socket when the agent side ends first;
+                # iter_text() then raises RuntimeError, which is a normal end of stream
+                if isinstance(e, RuntimeError) and websocket.application_state != WebSocketState.CONNECTED:
+                    if call_logger:
+                        call_logger.info("Twilio stream closed after the OpenAI session ended")
+                    else:
+                        logger.info(f"Twilio stream closed after the OpenAI session ended: {call_sid}")
+                elif call_logger:
+                    call_logger.exception(f"Error in twilio_to_openai: {e}")
                 else:
-                    logger.error(f"Error in twilio_to_openai: {e}")
+                    logger.exception(f"Error in twilio_to_openai: {e}")
+            
+            finally:
+                # Closing the OpenAI side ends openai_to_twilio without waiting on a keepalive
+                await openai_service.close_session(session_id)
+        
+        # OpenAI event handlers
+        async def on_audio_delta(event: dict):
+            """Audio response from assistant"""
+            audio_delta = event.get("delta", "")
+            
+            if media_prefix and audio_delta:
+                # Forward to Twilio via the outbound queue
+                await outbound_queue.put(audio_delta)
+        
+        async def on_audio_done(event: dict):
+            """Audio response completed"""
+            if call_logger:
+                call_logger.debug("Audio response completed")
+        
+        async def on_item_created(event: dict):
+            """Transcript for logging"""
+            item = event.get("item", {})
+            
+            if call_sid:
+                await db_service.log_conversation(call_sid, item)
+            
+            # Log transcript
+            if call_logger and item.get("type") == "message":
+                role = item.get("role", "")
+                content = item.get("content", [])
+                
+                if content:
+                    text = content[0].get("transcript", "") if content[0].get("type") == "audio" else content[0].get("text", "")
+                    if text:
+                        call_logger.info(f"{role.upper()}: {text[:100]}")
+        
+        async def on_function_call(event: dict):
+            """Function call initiated"""
+            function_name = event.get("name")
+            call_id = event.get("call_id")
+            arguments_str = event.get("arguments", "{}")
+            
+            if call_logger:
+                call_logger.info(f"Function call: {function_name}")
+            
+            try:
+                # Execute function
+                result = await execute_tool(function_name, arguments_str, call_sid)
+                
+                if call_logger:
+                    call_logger.info(f"Function result: {result}")
+                
+                # Send result back to OpenAI
+                await openai_service.send_function_result(
+                    openai_ws,
+                    call_id,
+                    result
+                )
+            
+            except Exception as e:
+                if call_logger:
+                    call_logger.error(f"Function execution error: {e}")
+                
+                # Send error result
+                await openai_service.send_function_result(
+                    openai_ws,
+                    call_id,
+                    {"error": str(e)}
+                )
+        
+        async def on_response_done(event: dict):
+            """Response completed"""
+            if call_logger:
+                call_logger.debug("Response generation completed")
+        
+        async def on_error(event: dict):
+            """Error from OpenAI"""
+            error_info = event.get("error", {})
+            if call_logger:
+                call_logger.error(f"OpenAI error: {error_info}")
+            else:
+                logger.error(f"OpenAI error: {error_info}")
+        
+        async def on_session_updated(event: dict):
+            """Session updated"""
+            if call_logger:
+                call_logger.debug("Session configuration updated")
+        
+        openai_handlers = {
+            "response.audio.delta": on_audio_delta,
+            "response.audio.done": on_audio_done,
+            "conversation.item.created": on_item_created,
+            "response.function_call_arguments.done": on_function_call,
+            "response.done": on_response_done,
+            "error": on_error,
+            "session.updated": on_session_updated
+        }
         
         async def openai_to_twilio():
             """Forward responses from OpenAI to Twilio"""
-            nonlocal call_logger
-            
             try:
-                async for event in openai_ws:
-                    event_type = event.get("type")
-                    
-                    # Audio response from assistant
-                    if event_type == "response.audio.delta":
-                        audio_delta = event.get("delta", "")
-                        
-                        if stream_sid and audio_delta:
-                            # Forward to Twilio
-                            await websocket.send_json({
-                                "event": "media",
-                                "streamSid": stream_sid,
-                                "media": {
-                                    "payload": audio_delta
-                                }
-                            })
-                    
-                    # Audio response completed
-                    elif event_type == "response.audio.done":
-                        if call_logger:
-                            call_logger.debug("Audio response completed")
-                    
-                    # Transcript for logging
-                    elif event_type == "conversation.item.created":
-                        item = event.get("item", {})
-                        
-                        if call_sid:
-                            await db_service.log_conversation(call_sid, item)
-                        
-                        # Log transcript
-                        if call_logger and item.get("type") == "message":
-                            role = item.get("role", "")
-                            content = item.get("content", [])
-                            
-                            if content:
-                                text = content[0].get("transcript", "") if content[0].get("type") == "audio" else content[0].get("text", "")
-                                if text:
-                                    call_logger.info(f"{role.upper()}: {text[:100]}")
+                async for raw_event in openai_service.iter_raw_events(openai_ws):
+                    # Fast path: splice audio deltas into the Twilio frame without parsing
+                    if raw_event.startswith(OPENAI_AUDIO_DELTA_PREFIX):
+                        match = OPENAI_DELTA_RE.search(raw_event)
+                        if match:
+                            if media_prefix:
+                                await outbound_queue.put(match.group(1).decode())
+                            continue
                     
-                    # Function call initiated
-                    elif event_type == "response.function_call_arguments.done":
-                        function_name = event.get("name")
-                        call_id = event.get("call_id")
-                        arguments_str = event.get("arguments", "{}")
-                        
-                        if call_logger:
-                            call_logger.info(f"Function call: {function_name}")
-                        
-                        try:
-                            arguments = json.loads(arguments_str)
-                            
-                            # Execute function
-                            result = await execute_tool(function_name, arguments, call_sid)
-                            
-                            if call_logger:
-                                call_logger.info(f"Function result: {result}")
-                            
-                            # Send result back to OpenAI
-                            await openai_service.send_function_result(
-                                openai_ws,
-                                call_id,
-                                result
-                            )
-                        
-                        except json.JSONDecodeError as e:
-                            if call_logger:
-                                call_logger.error(f"Failed to parse function arguments: {e}")
-                            
-                            # Send error result
-                            await openai_service.send_function_result(
-                                openai_ws,
-                                call_id,
-                                {"error": "Invalid arguments"}
-                            )
-                        
-                        except Exception as e:
-                            if call_logger:
-                                call_logger.error(f"Function execution error: {e}")
-                            
-                            # Send error result
-                            await openai_service.send_function_result(
-                                openai_ws,
-                                call_id,
-                                {"error": str(e)}
-                            )
+                    event = orjson.loads(raw_event)
+                    handler = openai_handlers.get(event.get("type"))
                     
-                    # Response completed
-                    elif event_type == "response.done":
-                        if call_logger:
-                            call_logger.debug("Response generation completed")
-                    
-                    # Error from OpenAI
-                    elif event_type == "error":
-                        error_info = event.get("error", {})
-                        if call_logger:
-                            call_logger.error(f"OpenAI error: {error_info}")
-                        else:
-                            logger.error(f"OpenAI error: {error_info}")
-                    
-                    # Session updated
-                    elif event_type == "session.updated":
-                        if call_logger:
-                            call_logger.debug("Session configuration updated")
+                    if handler is not None:
+                        await handler(event)
             
             except asyncio.CancelledError:
                 if call_logger:
                     call_logger.info("OpenAI stream cancelled")
                 raise
             
+            except ConnectionClosed as e:
+                # Expected when the session is torn down
+                if call_logger:
+                    call_logger.info(f"OpenAI WebSocket closed: {e}")
+                else:
+                    logger.info(f"OpenAI WebSocket closed: {call_sid}")
+            
+            except Exception as e:
+                if call_logger:
+                    call_logger.exception(f"Error in openai_to_twilio: {e}")
+                else:
+                    logger.exception(f"Error in openai_to_twilio: {e}")
+            
+            finally:
+                # Without an agent the call is over, so end the Twilio stream too
+                if websocket.application_state == WebSocketState.CONNECTED:
+                    try:
+                        await websocket.close()
+                    except RuntimeError:
+                        pass
+        
+        async def twilio_sender():
+            """Drain queued audio to Twilio, merging adjacent deltas into one frame"""
+            try:
+                while True:
+                    payloads = merge_audio_payloads(await outbound_queue.get(), outbound_queue)
+                    
+                    # Splice payloads into the cached envelope in one join (Twilio only accepts text frames)
+                    await websocket.send_text("".join((media_prefix, *payloads, TWILIO_MEDIA_SUFFIX)))
+            
+            except (WebSocketDisconnect, ConnectionClosed):
+                # Expected when Twilio hangs up mid-response
+                logger.info(f"Twilio WebSocket closed while sending: {call_sid}")
+            
             except Exception as e:
                 if call_logger:
-                    call_logger.error(f"Error in openai_to_twilio: {e}")
-                    call_logger.error(traceback.format_exc())
+                    call_logger.exception(f"Error in twilio_sender: {e}")
                 else:
-                    logger.error(f"Error in openai_to_twilio: {e}")
+                    logger.exception(f"Error in twilio_sender: {e}")
+            
+            # Keep draining so openai_to_twilio never blocks on a full queue
+            while True:
+                await outbound_queue.get()
         
-        # Run both streams concurrently
-        await asyncio.gather(
-            twilio_to_openai(),
-            openai_to_twilio(),
-            return_exceptions=True
-        )
+        sender_task = asyncio.create_task(twilio_sender())
+        
+        # Run both streams concurrently; each side closes the other when it ends
+        async with asyncio.TaskGroup() as tg:
+            tg.create_task(twilio_to_openai())
+            tg.create_task(openai_to_twilio())
     
     except Exception as e:
-        logger.error(f"WebSocket handler error: {e}")
-        logger.error(traceback.format_exc())
+        logger.exception(f"WebSocket handler error: {e}")
     
     finally:
         # Cleanup
+        if sender_task:
+            sender_task.cancel()
+            await asyncio.gather(sender_task, return_exceptions=True)
+        
         if call_sid:
             await cleanup_session(call_sid)
         
@@ -402,95 +629,103 @@ async def media_stream_handler(websocket: WebSocket):
         logger.info(f"WebSocket connection closed: {call_sid}")
 
 
-async def execute_tool(function_name: str, arguments: dict, call_sid: str) -> dict:
+async def run_lookup_order(args: LookupOrderArgs, call_sid: str, call_logger) -> dict:
+    """Fetch order details"""
+    result = await db_service.get_order_details(args.order_id)
+    
+    call_logger.info(f"Order lookup result: {result.get('status', 'unknown')}")
+    return result
+
+
+async def run_transfer_to_human(args: TransferToHumanArgs, call_sid: str, call_logger) -> dict:
+    """Transfer to human agent"""
+    call_logger.info(f"Transfer request - Reason: {args.reason}, Priority: {args.priority}")
+    
+    # Create transfer request
+    transfer_result = await db_service.create_transfer_request(
+        call_sid, args.reason, args.customer_context, args.priority
+    )
+    
+    # In production, trigger actual transfer workflow here
+    # For now, return confirmation
+    return {
+        "status": "transfer_initiated",
+        "message": "Bilkul, main aapko ek moment mein humare team member se connect kar deta hoon.",
+        "ticket_id": transfer_result.get("ticket_id"),
+        "estimated_wait_time": "2-3 minutes"
+    }
+
+
+async def run_check_product_availability(args: CheckProductAvailabilityArgs, call_sid: str, call_logger) -> dict:
+    """Check product availability"""
+    call_logger.info(f"Checking availability: {args.product_name}, pincode: {args.pincode}")
+    
+    return await db_service.check_inventory(args.product_name, args.pincode)
+
+
+async def run_create_ticket(args: CreateTicketArgs, call_sid: str, call_logger) -> dict:
+    """Create support ticket"""
+    call_logger.info(f"Creating ticket: {args.issue_type}")
+    
+    ticket = await db_service.create_support_ticket(
+        call_sid=call_sid,
+        issue_type=args.issue_type,
+        description=args.description,
+        customer_phone=args.customer_phone,
+        priority=args.priority
+    )
+    
+    return {
+        "status": "ticket_created",
+        "ticket_id": ticket.get("ticket_id"),
+        "message": f"Maine aapke liye ticket create kar diya hai. Aapka ticket number hai {ticket.get('ticket_id')}. Humari team 24 hours mein aapse contact karegi."
+    }
+
+
+# Tool name -> (handler, argument model)
+TOOLS = {
+    "lookup_order": (run_lookup_order, LookupOrderArgs),
+    "transfer_to_human": (run_transfer_to_human, TransferToHumanArgs),
+    "check_product_availability": (run_check_product_availability, CheckProductAvailabilityArgs),
+    "create_ticket": (run_create_ticket, CreateTicketArgs)
+}
+
+
+async def execute_tool(function_name: str, arguments_str: str, call_sid: str) -> dict:
     """
     Execute tool/function calls from OpenAI
     
     Args:
         function_name: Name of function to execute
-        arguments: Function arguments
+        arguments_str: JSON-encoded function arguments
         call_sid: Call identifier
         
     Returns:
         Function execution result
     """
     call_logger = get_call_logger(call_sid)
-    call_logger.info(f"Executing tool: {function_name} with args: {arguments}")
+    call_logger.info(f"Executing tool: {function_name} with args: {arguments_str}")
+    
+    handler, args_model = TOOLS.get(function_name, (None, None))
+    
+    if handler is None:
+        call_logger.warning(f"Unknown function: {function_name}")
+        return {
+            "error": f"Unknown function: {function_name}",
+            "message": "I'm sorry, I couldn't process that request."
+        }
     
     try:
-        if function_name == "lookup_order":
-            # Fetch order details
-            order_id = arguments.get("order_id")
-            result = await db_service.get_order_details(order_id)
-            
-            call_logger.info(f"Order lookup result: {result.get('status', 'unknown')}")
-            return result
-        
-        elif function_name == "transfer_to_human":
-            # Transfer to human agent
-            reason = arguments.get("reason")
-            context = arguments.get("customer_context")
-            priority = arguments.get("priority", "medium")
-            
-            call_logger.info(f"Transfer request - Reason: {reason}, Priority: {priority}")
-            
-            # Create transfer request
-            transfer_result = await db_service.create_transfer_request(
-                call_sid, reason, context, priority
-            )
-            
-            # In production, trigger actual transfer workflow here
-            # For now, return confirmation
-            return {
-                "status": "transfer_initiated",
-                "message": "Bilkul, main aapko ek moment mein humare team member se connect kar deta hoon.",
-                "ticket_id": transfer_result.get("ticket_id"),
-                "estimated_wait_time": "2-3 minutes"
-            }
-        
-        elif function_name == "check_product_availability":
-            # Check product availability
-            product_name = arguments.get("product_name")
-            pincode = arguments.get("pincode")
-            
-            call_logger.info(f"Checking availability: {product_name}, pincode: {pincode}")
-            
-            availability = await db_service.check_inventory(product_name, pincode)
-            return availability
-        
-        elif function_name == "create_ticket":
-            # Create support ticket
-            issue_type = arguments.get("issue_type")
-            description = arguments.get("description")
-            customer_phone = arguments.get("customer_phone")
-            priority = arguments.get("priority", "medium")
-            
-            call_logger.info(f"Creating ticket: {issue_type}")
-            
-            ticket = await db_service.create_support_ticket(
-                call_sid=call_sid,
-                issue_type=issue_type,
-                description=description,
-                customer_phone=customer_phone,
-                priority=priority
-            )
-            
-            return {
-                "status": "ticket_created",
-                "ticket_id": ticket.get("ticket_id"),
-                "message": f"Maine aapke liye ticket create kar diya hai. Aapka ticket number hai {ticket.get('ticket_id')}. Humari team 24 hours mein aapse contact karegi."
-            }
-        
-        else:
-            call_logger.warning(f"Unknown function: {function_name}")
-            return {
-                "error": f"Unknown function: {function_name}",
-                "message": "I'm sorry, I couldn't process that request."
-            }
+        # Parse and validate in one pass with pydantic-core
+        args = args_model.model_validate_json(arguments_str)
+        return await handler(args, call_sid, call_logger)
+    
+    except ValidationError as e:
+        call_logger.error(f"Invalid arguments for {function_name}: {e}")
+        return {"error": "Invalid arguments"}
     
     except Exception as e:
-        call_logger.error(f"Tool execution error: {e}")
-        call_logger.error(traceback.format_exc())
+        call_logger.exception(f"Tool execution error: {e}")
         
         return {
             "error": str(e),
@@ -498,6 +733,35 @@ async def execute_tool(function_name: str, arguments: dict, call_sid: str) -> di
         }
 
 
+async def reap_stale_sessions():
+    """
+    Clean up sessions whose OpenAI connection closed but whose handler never did
+    
+    A session is marked idle the first time it is seen with a closed connection and
+    reaped once it has stayed idle for SESSION_REAP_INTERVAL, leaving the media handler
+    time to clean up itself.
+    """
+    while True:
+        await asyncio.sleep(SESSION_REAP_INTERVAL)
+        
+        for call_sid in tuple(active_sessions):
+            session = active_sessions.get(call_sid)
+            if session is None or not openai_service.is_closed(session.openai_ws):
+                continue
+            
+            now = time.monotonic()
+            if session.idle_since is None:
+                session.idle_since = now
+                continue
+            
+            if now - session.idle_since < SESSION_REAP_INTERVAL:
+                continue
+            
+            logger.warning(f"Reaping stale session: {call_sid}")
+            await openai_service.close_session(session.openai_session_id)
+            await cleanup_session(call_sid)
+
+
 async def cleanup_session(call_sid: str):
     """
     Cleanup session resources
@@ -507,20 +771,22 @@ async def cleanup_session(call_sid: str):
     """
     try:
         if call_sid in active_sessions:
-            session_data = active_sessions[call_sid]
+            session = active_sessions[call_sid]
             
             # Calculate metrics
-            start_time = session_data.get("start_time")
-            if start_time:
-                duration = (datetime.utcnow() - start_time).total_seconds()
-                cost_estimate = estimate_call_cost(duration)
-                
-                logger.info(f"Call {call_sid} completed - Duration: {duration:.1f}s, Cost: ${cost_estimate['total_cost_usd']:.4f}")
+            duration = (time.monotonic_ns() - session.start_time_ns) / 1e9
+            cost_estimate = estimate_call_cost(duration)
+            
+            logger.info(f"Call {call_sid} completed - Duration: {duration:.1f}s, Cost: ${cost_estimate['total_cost_usd']:.4f}")
             
             # Remove from active sessions
             del active_sessions[call_sid]
             
             logger.info(f"Session cleaned up: {call_sid}")
+        
+        # Twilio never sends "stop" when the stream was closed from our side
+        if db_service.is_call_active(call_sid):
+            await db_service.end_call_record(call_sid)
     
     except Exception as e:
         logger.error(f"Error cleaning up session {call_sid}: {e}")
@@ -553,18 +819,17 @@ async def initiate_outbound_call(request: OutboundCallRequest):
             context=request.context
         )
         
-        logger.info(f"Outbound call initiated: {result['call_sid']}")
+        logger.info(f"Outbound call initiated: {result.call_sid}")
         
         return {
             "status": "success",
-            "call_sid": result["call_sid"],
+            "call_sid": result.call_sid,
             "to_number": to_number,
             "message": "Outbound call initiated successfully"
         }
     
     except Exception as e:
-        logger.error(f"Failed to initiate outbound call: {e}")
-        logger.error(traceback.format_exc())
+        logger.exception(f"Failed to initiate outbound call: {e}")
         
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -607,7 +872,7 @@ async def get_call_details(call_sid: str):
 async def get_metrics():
     """Get application metrics"""
     try:
-        active_calls = await db_service.get_active_calls_count()
+        active_calls = db_service.active_calls_count
         
         return {
             "active_calls": active_calls,
@@ -630,7 +895,7 @@ async def call_status_callback(request: Request):
         request: Request with status data
     """
     try:
-        form_data = await request.form()
+        form_data = await read_form_fields(request)
         call_sid = form_data.get("CallSid")
         call_status = form_data.get("CallStatus")
         
@@ -644,12 +909,19 @@ async def call_status_callback(request: Request):
 
 
 if __name__ == "__main__":
+    import sys
     import uvicorn
     
     uvicorn.run(
         app,
         host="0.0.0.0",
         port=settings.PORT,
+        # uvloop is not available on Windows
+        loop="asyncio" if sys.platform == "win32" else "uvloop",
+        http="httptools",
+        ws="websockets",
+        # Media frames are base64 audio; deflating them only costs CPU per packet
+        ws_per_message_deflate=False,
         log_level=settings.LOG_LEVEL.lower(),
-        access_log=True
+        access_log=settings.ENVIRONMENT != "production"
     )
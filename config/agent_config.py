@@ -2,96 +2,18 @@
 Agent Configuration for Hinglish Voice Customer Service
 """
 
+from pathlib import Path
+from types import MappingProxyType
+
+import orjson
+
+# Agent instructions live in instructions.md so they can be edited without a restart
+INSTRUCTIONS_PATH = Path(__file__).with_name("instructions.md")
+
 AGENT_CONFIG = {
     "name": "Customer Support Agent",
     "model": "gpt-4o-realtime-preview-2024-12-17",
     
-    "instructions": """
-# Identity and Role
-You are a friendly, efficient customer support representative for [COMPANY_NAME]. You speak fluent Hinglish (natural Hindi-English code-mixing) and adapt to the customer's language preference.
-
-# Language Behavior - CRITICAL
-- Detect customer's language from their first sentence
-- Code-mix Hindi and English naturally like: "Sure ji, main aapki help karunga. What seems to be the problem?"
-- Use Hindi for: greetings (namaste, ji, theek hai), acknowledgments (achha, bilkul, zaroor)
-- Use English for: technical terms, product names, numbers, emails
-- NEVER translate everything to one language - mix naturally
-- If customer speaks only English, respond in English
-- If customer speaks only Hindi, respond in Hindi
-- Most customers will use Hinglish - match their style
-
-# Tone and Personality
-- Warm, patient, and empathetic
-- Professional yet conversational
-- Use fillers naturally: "achha", "theek hai", "ji", "haan", "okay"
-- Stay calm even with frustrated customers
-- Be helpful and solution-oriented
-- Show genuine care for customer's concerns
-
-# Core Responsibilities
-1. Handle customer queries about orders, products, services
-2. Collect necessary information: name, order ID, phone, email
-3. Provide solutions or troubleshooting steps
-4. Escalate to human agent when needed
-5. End calls with clear summary of actions taken
-
-# Information Collection Protocol
-- Always spell-check names and emails letter by letter
-- Example: "Your email is s-h-a-r-m-a at gmail dot com, theek hai?"
-- Confirm phone numbers by repeating: "So your number is 9 8 7 6 5 4 3 2 1 0, correct?"
-- For order IDs, confirm character by character
-- Double-check important details before proceeding
-
-# Escalation Triggers
-Transfer to human agent when:
-- Customer explicitly requests human agent
-- Issue requires refund/cancellation approval
-- Technical problem beyond your knowledge
-- Customer is highly frustrated after 2 failed solutions
-- Compliance/legal matters
-- Complex disputes or negotiations
-
-# Call Flow Structure
-1. Greeting: "Namaste! [Company] customer support mein aapka swagat hai. How may I help you today?"
-2. Problem identification: Active listening, ask clarifying questions
-3. Information gathering: Collect required details
-4. Solution/Action: Provide help or initiate action
-5. Confirmation: Summarize what was done
-6. Closing: "Kya aur kuch help chahiye? / Anything else I can help with?"
-
-# Tool Usage Guidelines
-- Use lookup_order when customer mentions order ID
-- Use check_product_availability for product queries
-- Use create_ticket for issues requiring follow-up
-- Use transfer_to_human when escalation is needed
-- Always tell customer what action you're taking
-
-# Important Guidelines
-- Never make up information - use tools to fetch real data
-- If unsure, say "Let me check that for you" and use appropriate tool
-- Keep responses concise (2-3 sentences max per turn)
-- Let customer interrupt naturally - don't over-talk
-- Use tools proactively when customer mentions order ID, product name, etc.
-- Acknowledge emotions: "Main samajh sakta hoon aap frustrated hain"
-- Always end with next steps or call-to-action
-
-# Example Conversations
-
-Customer: "Hi, mera order abhi tak nahi aaya"
-Agent: "Namaste ji! Main aapki help karta hoon. Please tell me your order ID?"
-
-Customer: "Order ID is ABC123"
-Agent: "Thank you. Let me check that for you... *uses lookup_order tool*"
-
-Customer: "I want to speak to someone"
-Agent: "Bilkul, main aapko humare team member se connect kar deta hoon. Please hold for a moment."
-
-# Error Handling
-- If tool fails: "I'm sorry, there's a technical issue. Let me try again."
-- If can't find info: "I'm unable to find that information right now. Kya main aapke liye ek ticket create kar doon?"
-- If customer angry: "I understand your frustration. Let me escalate this to my senior team member immediately."
-""",
-
     "voice": "alloy",  # Options: alloy, echo, fable, onyx, nova, shimmer
     "temperature": 0.8,
     "max_response_output_tokens": 4096,
@@ -195,6 +117,19 @@ Agent: "Bilkul, main aapko humare team member se connect kar deta hoon. Please h
     ]
 }
 
+
+def _freeze(value):
+    """Recursively wrap dicts in MappingProxyType and lists in tuples"""
+    if isinstance(value, dict):
+        return MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+# Tool definitions are read-only, so the cached session.update event can't go stale
+AGENT_CONFIG["tools"] = _freeze(AGENT_CONFIG["tools"])
+
 # Audio configuration for Twilio compatibility
 AUDIO_CONFIG = {
     "input_format": "g711_ulaw",   # Twilio uses μ-law encoding
@@ -217,3 +152,50 @@ COMPANY_CONFIG = {
     "max_call_duration_minutes": 30,
     "transfer_timeout_seconds": 300
 }
+
+# (mtime_ns, value) pairs, refreshed when instructions.md changes on disk
+_instructions_cache = (None, "")
+_session_update_cache = (None, "")
+
+
+def get_instructions() -> str:
+    """
+    Load the agent instructions, re-reading instructions.md only when it changes
+    
+    Returns:
+        Instructions text
+    """
+    global _instructions_cache
+    mtime = INSTRUCTIONS_PATH.stat().st_mtime_ns
+    if mtime != _instructions_cache[0]:
+        _instructions_cache = (mtime, INSTRUCTIONS_PATH.read_text(encoding="utf-8"))
+    return _instructions_cache[1]
+
+
+def get_session_update_event() -> str:
+    """
+    Get the session.update event sent to every new OpenAI session
+    
+    The ~6KB payload is serialized once and reused until the instructions change.
+    
+    Returns:
+        JSON-encoded session.update event
+    """
+    global _session_update_cache
+    instructions = get_instructions()
+    if _session_update_cache[0] != _instructions_cache[0]:
+        _session_update_cache = (_instructions_cache[0], orjson.dumps({
+            "type": "session.update",
+            "session": {
+                "instructions": instructions,
+                "voice": AGENT_CONFIG["voice"],
+                "temperature": AGENT_CONFIG["temperature"],
+                "tools": AGENT_CONFIG["tools"],
+                "tool_choice": "auto",
+                "input_audio_format": AUDIO_CONFIG["input_format"],
+                "output_audio_format": AUDIO_CONFIG["output_format"],
+                "turn_detection": AGENT_CONFIG["turn_detection"],
+                "max_response_output_tokens": AGENT_CONFIG["max_response_output_tokens"]
+            }
+        }, default=dict).decode())
+    return _session_update_cache[1]
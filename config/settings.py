@@ -1,8 +1,28 @@
-from pydantic_settings import BaseSettings
-from typing import Optional
+import os
+from dataclasses import dataclass, fields, MISSING
+from functools import cache
+from typing import Optional, Dict
+from dotenv import dotenv_values
 
 
-class Settings(BaseSettings):
+@cache
+def load_env(env_file: str = ".env") -> Dict[str, str]:
+    """
+    Read the .env file once and merge it with the process environment
+    
+    Process environment variables take precedence over the .env file.
+    
+    Args:
+        env_file: Path to the .env file
+        
+    Returns:
+        Environment variables by name
+    """
+    return {**dotenv_values(env_file), **os.environ}
+
+
+@dataclass(frozen=True, slots=True)
+class Settings:
     """Application settings from environment variables"""
     
     OPENAI_API_KEY: str
@@ -14,15 +34,41 @@ class Settings(BaseSettings):
     ENVIRONMENT: str = "development"
     LOG_LEVEL: str = "INFO"
     
+    # Capacity limits
+    MAX_CONCURRENT_HANDSHAKES: int = 100
+    MAX_ACTIVE_SESSIONS: int = 500
+    
     # Optional settings
     REDIS_URL: Optional[str] = None
     DATABASE_URL: Optional[str] = None
     SENTRY_DSN: Optional[str] = None
     
-    class Config:
-        env_file = ".env"
-        case_sensitive = True
+    @classmethod
+    def from_env(cls, env_file: str = ".env") -> "Settings":
+        """
+        Build settings from the process environment and .env file
+        
+        Args:
+            env_file: Path to the .env file
+        
+        Returns:
+            Settings instance
+        """
+        env = load_env(env_file)
+        
+        missing = [f.name for f in fields(cls) if f.default is MISSING and f.name not in env]
+        if missing:
+            raise RuntimeError(f"Missing required environment variables: {', '.join(missing)}")
+        
+        values = {}
+        for f in fields(cls):
+            if f.name in env:
+                values[f.name] = int(env[f.name]) if f.type is int else env[f.name]
+        
+        return cls(**values)
 
 
-# Global settings instance
-settings = Settings()
+@cache
+def get_settings() -> Settings:
+    """Application settings, read and validated on first use"""
+    return Settings.from_env()
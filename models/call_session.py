@@ -3,84 +3,93 @@ Call Session Models
 Data models for call sessions and related entities
 """
 
+import asyncio
+from dataclasses import dataclass, field
 from datetime import datetime
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Literal
 from pydantic import BaseModel, Field
-from enum import Enum
 
 
-class CallStatus(str, Enum):
-    """Call status enumeration"""
-    INITIATED = "initiated"
-    RINGING = "ringing"
-    IN_PROGRESS = "in-progress"
-    COMPLETED = "completed"
-    FAILED = "failed"
-    BUSY = "busy"
-    NO_ANSWER = "no-answer"
-    CANCELLED = "cancelled"
-
-
-class CallDirection(str, Enum):
-    """Call direction"""
-    INBOUND = "inbound"
-    OUTBOUND = "outbound"
-
-
-class Priority(str, Enum):
-    """Priority levels"""
-    LOW = "low"
-    MEDIUM = "medium"
-    HIGH = "high"
-
-
-class CallSession(BaseModel):
+# Enumerated fields are plain strings checked with Literal, the same values on the wire
+CallStatus = Literal[
+    "initiated", "ringing", "in-progress", "completed",
+    "failed", "busy", "no-answer", "cancelled"
+]
+CALL_STATUS_INITIATED = "initiated"
+CALL_STATUS_RINGING = "ringing"
+CALL_STATUS_IN_PROGRESS = "in-progress"
+CALL_STATUS_COMPLETED = "completed"
+CALL_STATUS_FAILED = "failed"
+CALL_STATUS_BUSY = "busy"
+CALL_STATUS_NO_ANSWER = "no-answer"
+CALL_STATUS_CANCELLED = "cancelled"
+
+CallDirection = Literal["inbound", "outbound"]
+CALL_DIRECTION_INBOUND = "inbound"
+CALL_DIRECTION_OUTBOUND = "outbound"
+
+Priority = Literal["low", "medium", "high"]
+PRIORITY_LOW = "low"
+PRIORITY_MEDIUM = "medium"
+PRIORITY_HIGH = "high"
+
+# Initial ticket statuses; later values are set by the support workflow
+TICKET_STATUS_QUEUED = "queued"
+TICKET_STATUS_OPEN = "open"
+
+
+# Records built from trusted in-process data are plain dataclasses; orjson
+# serializes them (including datetimes) natively. Pydantic models are kept for
+# input that needs validation: tool arguments and API request bodies.
+@dataclass(slots=True, kw_only=True)
+class CallSession:
     """Call session data model"""
     
-    call_sid: str = Field(..., description="Twilio Call SID")
-    stream_sid: Optional[str] = Field(None, description="Twilio Stream SID")
-    direction: CallDirection = Field(CallDirection.INBOUND, description="Call direction")
-    from_number: str = Field(..., description="Caller's phone number")
-    to_number: str = Field(..., description="Recipient's phone number")
-    status: CallStatus = Field(CallStatus.INITIATED, description="Current call status")
+    call_sid: str  # Twilio Call SID
+    stream_sid: Optional[str] = None  # Twilio Stream SID
+    direction: CallDirection = CALL_DIRECTION_INBOUND
+    from_number: str  # Caller's phone number
+    to_number: str  # Recipient's phone number
+    status: CallStatus = CALL_STATUS_INITIATED
     
-    start_time: datetime = Field(default_factory=datetime.utcnow, description="Call start time")
-    end_time: Optional[datetime] = Field(None, description="Call end time")
-    duration: Optional[float] = Field(None, description="Call duration in seconds")
+    start_time: datetime = field(default_factory=datetime.utcnow)
+    end_time: Optional[datetime] = None
+    duration: Optional[float] = None  # Call duration in seconds
     
-    openai_session_id: Optional[str] = Field(None, description="OpenAI session identifier")
+    openai_session_id: Optional[str] = None
     
-    customer_context: Optional[Dict[str, Any]] = Field(
-        default_factory=dict,
-        description="Customer-specific context data"
-    )
-    
-    metadata: Optional[Dict[str, Any]] = Field(
-        default_factory=dict,
-        description="Additional metadata"
-    )
+    customer_context: Optional[Dict[str, Any]] = field(default_factory=dict)  # Customer-specific context data
+    metadata: Optional[Dict[str, Any]] = field(default_factory=dict)
+
+
+@dataclass(slots=True)
+class SessionState:
+    """In-process state of an active media stream"""
     
-    class Config:
-        use_enum_values = True
+    call_sid: str
+    stream_sid: str
+    openai_session_id: str
+    openai_ws: Any
+    start_time_ns: int  # time.monotonic_ns() at stream start
+    from_number: str
+    outbound_queue: asyncio.Queue
+    idle_since: Optional[float] = None  # time.monotonic() when first seen with a closed OpenAI connection
 
 
-class ConversationItem(BaseModel):
+@dataclass(slots=True, kw_only=True)
+class ConversationItem:
     """Conversation turn/item"""
     
     call_sid: str
     item_id: str
     item_type: str  # message, function_call, function_call_output
     role: Optional[str] = None  # user, assistant, system
-    content: List[Dict[str, Any]] = Field(default_factory=list)
-    timestamp: datetime = Field(default_factory=datetime.utcnow)
-    
-    class Config:
-        json_encoders = {
-            datetime: lambda v: v.isoformat()
-        }
+    content: List[Dict[str, Any]] = field(default_factory=list)
+    timestamp: datetime = field(default_factory=datetime.utcnow)
 
 
-class FunctionCall(BaseModel):
+@dataclass(slots=True, kw_only=True)
+class FunctionCall:
     """Function call details"""
     
     call_id: str
@@ -89,25 +98,57 @@ class FunctionCall(BaseModel):
     result: Optional[Dict[str, Any]] = None
     execution_time: Optional[float] = None
     error: Optional[str] = None
-    timestamp: datetime = Field(default_factory=datetime.utcnow)
+    timestamp: datetime = field(default_factory=datetime.utcnow)
 
 
-class TransferRequest(BaseModel):
+class LookupOrderArgs(BaseModel):
+    """Arguments for the lookup_order tool"""
+    
+    order_id: str
+
+
+class TransferToHumanArgs(BaseModel):
+    """Arguments for the transfer_to_human tool"""
+    
+    reason: str
+    customer_context: str
+    priority: Priority = PRIORITY_MEDIUM
+
+
+class CheckProductAvailabilityArgs(BaseModel):
+    """Arguments for the check_product_availability tool"""
+    
+    product_name: str
+    pincode: Optional[str] = None
+
+
+class CreateTicketArgs(BaseModel):
+    """Arguments for the create_ticket tool"""
+    
+    issue_type: str
+    description: str
+    customer_phone: Optional[str] = None
+    priority: Priority = PRIORITY_MEDIUM
+
+
+@dataclass(slots=True, kw_only=True)
+class TransferRequest:
     """Transfer to human agent request"""
     
     ticket_id: str
     call_sid: str
     reason: str
     customer_context: str
-    priority: Priority = Priority.MEDIUM
-    status: str = "queued"  # queued, assigned, completed
+    priority: Priority = PRIORITY_MEDIUM
+    status: str = TICKET_STATUS_QUEUED  # queued, assigned, completed
     assigned_agent: Optional[str] = None
-    created_at: datetime = Field(default_factory=datetime.utcnow)
+    created_at: datetime = field(default_factory=datetime.utcnow)
     assigned_at: Optional[datetime] = None
     completed_at: Optional[datetime] = None
 
 
-class SupportTicket(BaseModel):
+@dataclass(slots=True, kw_only=True)
+class SupportTicket:
     """Support ticket"""
     
     ticket_id: str
@@ -115,23 +156,24 @@ class SupportTicket(BaseModel):
     issue_type: str
     description: str
     customer_phone: Optional[str] = None
-    priority: Priority = Priority.MEDIUM
-    status: str = "open"  # open, in-progress, resolved, closed
+    priority: Priority = PRIORITY_MEDIUM
+    status: str = TICKET_STATUS_OPEN  # open, in-progress, resolved, closed
     assigned_agent: Optional[str] = None
     resolution: Optional[str] = None
-    created_at: datetime = Field(default_factory=datetime.utcnow)
+    created_at: datetime = field(default_factory=datetime.utcnow)
     updated_at: Optional[datetime] = None
     resolved_at: Optional[datetime] = None
 
 
-class OrderDetails(BaseModel):
+@dataclass(slots=True, kw_only=True)
+class OrderDetails:
     """Order details model"""
     
     order_id: str
     status: str
     order_date: str
     delivery_date: Optional[str] = None
-    items: List[Dict[str, Any]] = Field(default_factory=list)
+    items: List[Dict[str, Any]] = field(default_factory=list)
     subtotal: str
     shipping: str
     total: str
@@ -139,7 +181,8 @@ class OrderDetails(BaseModel):
     shipping_address: Optional[str] = None
 
 
-class ProductAvailability(BaseModel):
+@dataclass(slots=True, kw_only=True)
+class ProductAvailability:
     """Product availability model"""
     
     product: str
@@ -158,11 +201,37 @@ class OutboundCallRequest(BaseModel):
         default_factory=dict,
         description="Context data for the call"
     )
-    priority: Priority = Priority.MEDIUM
+    priority: Priority = PRIORITY_MEDIUM
     scheduled_time: Optional[datetime] = None
 
 
-class CallMetrics(BaseModel):
+@dataclass(slots=True, kw_only=True)
+class TwilioCallRecord:
+    """Call state as reported by the Twilio REST API"""
+    
+    call_sid: str
+    status: str
+    to_number: Optional[str] = None
+    from_number: Optional[str] = None
+    direction: Optional[str] = None
+    duration: Optional[str] = None
+    start_time: Optional[str] = None
+    end_time: Optional[str] = None
+    price: Optional[str] = None
+    url: Optional[str] = None  # TwiML URL the call was redirected to
+
+
+@dataclass(slots=True, kw_only=True)
+class SmsRecord:
+    """SMS message as reported by the Twilio REST API"""
+    
+    message_sid: str
+    status: str
+    to_number: str
+
+
+@dataclass(slots=True, kw_only=True)
+class CallMetrics:
     """Call metrics and analytics"""
     
     total_calls: int = 0
@@ -174,4 +243,4 @@ class CallMetrics(BaseModel):
     transfer_rate: float = 0.0
     success_rate: float = 0.0
     
-    timestamp: datetime = Field(default_factory=datetime.utcnow)
+    timestamp: datetime = field(default_factory=datetime.utcnow)
@@ -4,12 +4,94 @@ Handles all database operations for call records, conversations, tickets, etc.
 Replace with your actual database implementation (PostgreSQL, MongoDB, etc.)
 """
 
+import asyncio
+import itertools
+import os
+from collections import OrderedDict, defaultdict, deque
 from datetime import datetime
+from types import MappingProxyType
 from typing import Optional, Dict, List, Any
+from models.call_session import (
+    CALL_STATUS_IN_PROGRESS,
+    CALL_STATUS_COMPLETED,
+    TICKET_STATUS_QUEUED,
+    TICKET_STATUS_OPEN
+)
+from utils.helpers import utc_isoformat, utc_stamp
 from utils.logger import get_logger
 
 logger = get_logger(__name__)
 
+# Conversation entries are written in batches off the audio path
+CONVERSATION_FLUSH_INTERVAL = 0.05
+CONVERSATION_BATCH_SIZE = 64
+
+# In-memory cache bounds; ended calls are evicted least recently ended first
+MAX_CACHED_CALLS = 10000
+MAX_CONVERSATION_ITEMS_PER_CALL = 500
+
+# Static parts of the mock lookups, built once; each call only adds the requested ID.
+# Items are nested, so they are copied per call rather than shared between callers
+_MOCK_ORDER_ITEMS = (
+    MappingProxyType({"name": "Product A", "quantity": 1, "price": "₹1,200"}),
+    MappingProxyType({"name": "Product B", "quantity": 2, "price": "₹650"})
+)
+
+_MOCK_ORDER_TEMPLATE = MappingProxyType({
+    "status": "Delivered",
+    "order_date": "2025-10-10",
+    "delivery_date": "2025-10-15",
+    "subtotal": "₹2,500",
+    "shipping": "₹0",
+    "total": "₹2,500",
+    "payment_method": "Credit Card",
+    "shipping_address": "123 Main St, Mumbai, 400001"
+})
+
+_MOCK_INVENTORY_TEMPLATE = MappingProxyType({
+    "available": True,
+    "stock_count": 45,
+    "delivery_estimate": "3-5 business days",
+    "price": "₹1,299",
+    "pincode_serviceable": None
+})
+
+_MOCK_INVENTORY_PINCODE_TEMPLATE = MappingProxyType({
+    **_MOCK_INVENTORY_TEMPLATE,
+    "delivery_estimate": "2-3 business days",
+    "pincode_serviceable": True
+})
+
+# Ticket IDs add a per-process tag and a process-wide counter to the cached second,
+# so they stay unique within a second and across uvicorn workers
+_ticket_counter = itertools.count(1)
+_process_tag = ""
+
+
+def _reset_ticket_ids():
+    """Give this process its own ticket tag and counter (re-run in forked children)"""
+    global _ticket_counter, _process_tag
+    _ticket_counter = itertools.count(1)
+    _process_tag = format(os.getpid(), "X")
+
+
+_reset_ticket_ids()
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_ticket_ids)
+
+
+def _new_ticket_id(prefix: str) -> str:
+    """
+    Generate a sortable ticket ID from the current UTC second, process and counter
+    
+    Args:
+        prefix: Ticket type prefix (e.g. TXF, SUP)
+        
+    Returns:
+        Ticket ID unique across worker processes
+    """
+    return f"{prefix}-{utc_stamp()}-{_process_tag}-{next(_ticket_counter)}"
+
 
 class DatabaseService:
     """Service for database operations"""
@@ -17,9 +99,21 @@ class DatabaseService:
     def __init__(self):
         # Initialize your database connection here
         # Example: self.db = await asyncpg.create_pool(DATABASE_URL)
-        self.calls_cache = {}  # Temporary in-memory storage for demo
+        self.calls_cache = OrderedDict()  # Temporary in-memory storage for demo
         self.conversations_cache = {}
         self.tickets_cache = {}
+        
+        # Secondary indexes, kept in step with status changes so lookups don't scan the caches
+        self._active_calls = set()
+        self._tickets_by_status = defaultdict(set)
+        
+        self._log_queue: asyncio.Queue = asyncio.Queue()
+        self._flusher = None
+    
+    async def connect(self):
+        """Start the conversation log flusher"""
+        self._flusher = asyncio.create_task(self._flush_loop())
+        logger.info("Database service started, using in-memory storage")
     
     async def create_call_record(self, call_sid: str, call_data: dict) -> Dict:
         """
@@ -33,22 +127,24 @@ class DatabaseService:
             Created record
         """
         try:
+            now = utc_isoformat()
             record = {
                 "call_sid": call_sid,
                 "from_number": call_data.get("from", ""),
                 "to_number": call_data.get("to", ""),
-                "start_time": datetime.utcnow().isoformat(),
+                "start_time": now,
                 "end_time": None,
                 "duration": None,
-                "status": "in-progress",
+                "status": CALL_STATUS_IN_PROGRESS,
                 "stream_sid": call_data.get("streamSid"),
                 "custom_parameters": call_data.get("customParameters", {}),
-                "created_at": datetime.utcnow().isoformat()
+                "created_at": now
             }
             
             # Store in database
             # await self.db.execute("INSERT INTO calls (...) VALUES (...)", ...)
             self.calls_cache[call_sid] = record
+            self._active_calls.add(call_sid)
             
             logger.info(f"Call record created: {call_sid}")
             return record
@@ -70,13 +166,17 @@ class DatabaseService:
         try:
             if call_sid in self.calls_cache:
                 record = self.calls_cache[call_sid]
-                end_time = datetime.utcnow()
+                end_time = utc_isoformat()
                 start_time = datetime.fromisoformat(record["start_time"])
-                duration = (end_time - start_time).total_seconds()
+                duration = (datetime.fromisoformat(end_time) - start_time).total_seconds()
                 
-                record["end_time"] = end_time.isoformat()
+                record["end_time"] = end_time
                 record["duration"] = duration
-                record["status"] = "completed"
+                record["status"] = CALL_STATUS_COMPLETED
+                self._active_calls.discard(call_sid)
+                
+                self.calls_cache.move_to_end(call_sid)
+                self._evict_ended_calls()
                 
                 # Update database
                 # await self.db.execute("UPDATE calls SET ... WHERE call_sid = $1", call_sid)
@@ -90,10 +190,25 @@ class DatabaseService:
             logger.error(f"Failed to end call record: {e}")
             raise
     
+    def _evict_ended_calls(self):
+        """Drop the oldest ended calls and their conversations beyond MAX_CACHED_CALLS"""
+        excess = len(self.calls_cache) - MAX_CACHED_CALLS
+        if excess <= 0:
+            return
+        
+        # In-progress calls are skipped, so the cache can only overshoot by the active call count
+        for call_sid in tuple(itertools.islice(self.calls_cache, excess)):
+            if call_sid not in self._active_calls:
+                del self.calls_cache[call_sid]
+                self.conversations_cache.pop(call_sid, None)
+    
     async def log_conversation(self, call_sid: str, conversation_item: dict) -> Dict:
         """
         Log conversation turn (transcript)
         
+        Entries are queued and written in batches by the flush loop started in
+        connect(); without a running flush loop they are written immediately.
+        
         Args:
             call_sid: Call identifier
             conversation_item: OpenAI conversation item
@@ -102,33 +217,70 @@ class DatabaseService:
             Logged item
         """
         try:
-            item_id = conversation_item.get("id")
-            item_type = conversation_item.get("type")
-            
-            log_entry = {
-                "call_sid": call_sid,
-                "item_id": item_id,
-                "item_type": item_type,
-                "role": conversation_item.get("role"),
-                "content": conversation_item.get("content", []),
-                "timestamp": datetime.utcnow().isoformat()
-            }
-            
-            # Store in database
-            # await self.db.execute("INSERT INTO conversations (...) VALUES (...)", ...)
-            
-            if call_sid not in self.conversations_cache:
-                self.conversations_cache[call_sid] = []
+            log_entry = self._build_conversation_entry(call_sid, conversation_item, utc_isoformat())
             
-            self.conversations_cache[call_sid].append(log_entry)
+            if self._flusher is None:
+                await self._write_conversation_batch([log_entry])
+            else:
+                self._log_queue.put_nowait(log_entry)
             
-            logger.debug(f"Conversation logged for {call_sid}: {item_type}")
             return log_entry
             
         except Exception as e:
             logger.error(f"Failed to log conversation: {e}")
             raise
     
+    async def _flush_loop(self):
+        """Write queued conversation entries in batches of up to CONVERSATION_BATCH_SIZE"""
+        while True:
+            batch = [await self._log_queue.get()]
+            
+            try:
+                # Let the rest of the turn arrive before writing, unless the batch is already full
+                if self._log_queue.qsize() < CONVERSATION_BATCH_SIZE - 1:
+                    await asyncio.sleep(CONVERSATION_FLUSH_INTERVAL)
+            finally:
+                # Also runs on shutdown so dequeued entries are not lost
+                while len(batch) < CONVERSATION_BATCH_SIZE and not self._log_queue.empty():
+                    batch.append(self._log_queue.get_nowait())
+                
+                await self._write_conversation_batch(batch)
+    
+    async def _write_conversation_batch(self, log_entries: List[Dict]):
+        """
+        Store a batch of conversation log entries in a single write
+        
+        Args:
+            log_entries: Entries in arrival order
+        """
+        try:
+            # Store in database
+            # await self.db.executemany("INSERT INTO conversations (...) VALUES (...)", ...)
+            
+            for log_entry in log_entries:
+                call_sid = log_entry["call_sid"]
+                if call_sid not in self.conversations_cache:
+                    self.conversations_cache[call_sid] = deque(maxlen=MAX_CONVERSATION_ITEMS_PER_CALL)
+                
+                self.conversations_cache[call_sid].append(log_entry)
+            
+            logger.debug(f"Conversation batch logged: {len(log_entries)} items")
+            
+        except Exception as e:
+            logger.error(f"Failed to log conversation batch: {e}")
+    
+    @staticmethod
+    def _build_conversation_entry(call_sid: str, conversation_item: dict, timestamp: str) -> Dict:
+        """Build a conversation log row from an OpenAI conversation item"""
+        return {
+            "call_sid": call_sid,
+            "item_id": conversation_item.get("id"),
+            "item_type": conversation_item.get("type"),
+            "role": conversation_item.get("role"),
+            "content": conversation_item.get("content", []),
+            "timestamp": timestamp
+        }
+    
     async def get_call_record(self, call_sid: str) -> Optional[Dict]:
         """
         Retrieve call record
@@ -163,7 +315,7 @@ class DatabaseService:
             # Fetch from database
             # records = await self.db.fetch("SELECT * FROM conversations WHERE call_sid = $1 ORDER BY timestamp", call_sid)
             
-            return self.conversations_cache.get(call_sid, [])
+            return list(self.conversations_cache.get(call_sid, ()))
             
         except Exception as e:
             logger.error(f"Failed to get conversation history: {e}")
@@ -187,24 +339,12 @@ class DatabaseService:
             # order = await self.db.fetchrow("SELECT * FROM orders WHERE order_id = $1", order_id)
             
             # Mock data for demonstration
-            mock_order = {
+            return {
                 "order_id": order_id,
-                "status": "Delivered",
-                "order_date": "2025-10-10",
-                "delivery_date": "2025-10-15",
-                "items": [
-                    {"name": "Product A", "quantity": 1, "price": "₹1,200"},
-                    {"name": "Product B", "quantity": 2, "price": "₹650"}
-                ],
-                "subtotal": "₹2,500",
-                "shipping": "₹0",
-                "total": "₹2,500",
-                "payment_method": "Credit Card",
-                "shipping_address": "123 Main St, Mumbai, 400001"
+                **_MOCK_ORDER_TEMPLATE,
+                "items": [dict(item) for item in _MOCK_ORDER_ITEMS]
             }
             
-            return mock_order
-            
         except Exception as e:
             logger.error(f"Failed to fetch order details: {e}")
             return {
@@ -229,16 +369,8 @@ class DatabaseService:
             # Mock implementation - replace with real inventory system
             # inventory = await self.db.fetchrow("SELECT * FROM inventory WHERE product_name = $1", product_name)
             
-            mock_inventory = {
-                "product": product_name,
-                "available": True,
-                "stock_count": 45,
-                "delivery_estimate": "2-3 business days" if pincode else "3-5 business days",
-                "price": "₹1,299",
-                "pincode_serviceable": True if pincode else None
-            }
-            
-            return mock_inventory
+            template = _MOCK_INVENTORY_PINCODE_TEMPLATE if pincode else _MOCK_INVENTORY_TEMPLATE
+            return {"product": product_name, **template}
             
         except Exception as e:
             logger.error(f"Failed to check inventory: {e}")
@@ -268,7 +400,7 @@ class DatabaseService:
             Transfer request details
         """
         try:
-            ticket_id = f"TXF-{datetime.utcnow().strftime('%Y%m%d%H%M%S')}"
+            ticket_id = _new_ticket_id("TXF")
             
             transfer_request = {
                 "ticket_id": ticket_id,
@@ -276,14 +408,15 @@ class DatabaseService:
                 "reason": reason,
                 "context": context,
                 "priority": priority,
-                "status": "queued",
-                "created_at": datetime.utcnow().isoformat(),
+                "status": TICKET_STATUS_QUEUED,
+                "created_at": utc_isoformat(),
                 "assigned_agent": None
             }
             
             # Store in database
             # await self.db.execute("INSERT INTO transfer_requests (...) VALUES (...)", ...)
             self.tickets_cache[ticket_id] = transfer_request
+            self._tickets_by_status[TICKET_STATUS_QUEUED].add(ticket_id)
             
             logger.info(f"Transfer request created: {ticket_id}")
             return transfer_request
@@ -314,7 +447,7 @@ class DatabaseService:
             Ticket details
         """
         try:
-            ticket_id = f"SUP-{datetime.utcnow().strftime('%Y%m%d%H%M%S')}"
+            ticket_id = _new_ticket_id("SUP")
             
             ticket = {
                 "ticket_id": ticket_id,
@@ -323,8 +456,8 @@ class DatabaseService:
                 "description": description,
                 "customer_phone": customer_phone,
                 "priority": priority,
-                "status": "open",
-                "created_at": datetime.utcnow().isoformat(),
+                "status": TICKET_STATUS_OPEN,
+                "created_at": utc_isoformat(),
                 "assigned_agent": None,
                 "resolution": None
             }
@@ -332,6 +465,7 @@ class DatabaseService:
             # Store in database
             # await self.db.execute("INSERT INTO support_tickets (...) VALUES (...)", ...)
             self.tickets_cache[ticket_id] = ticket
+            self._tickets_by_status[TICKET_STATUS_OPEN].add(ticket_id)
             
             logger.info(f"Support ticket created: {ticket_id}")
             return ticket
@@ -360,6 +494,26 @@ class DatabaseService:
             logger.error(f"Failed to get ticket: {e}")
             return None
     
+    async def get_tickets_by_status(self, status: str) -> List[Dict]:
+        """
+        Retrieve all tickets with a given status
+        
+        Args:
+            status: Ticket status (e.g. queued, open, resolved)
+            
+        Returns:
+            Matching tickets
+        """
+        try:
+            # Fetch from database
+            # tickets = await self.db.fetch("SELECT * FROM tickets WHERE status = $1", status)
+            
+            return [self.tickets_cache[ticket_id] for ticket_id in self._tickets_by_status.get(status, ())]
+            
+        except Exception as e:
+            logger.error(f"Failed to get tickets by status: {e}")
+            return []
+    
     async def update_ticket_status(self, ticket_id: str, status: str, resolution: Optional[str] = None) -> Dict:
         """
         Update ticket status
@@ -375,12 +529,15 @@ class DatabaseService:
         try:
             if ticket_id in self.tickets_cache:
                 ticket = self.tickets_cache[ticket_id]
+                now = utc_isoformat()
+                self._tickets_by_status[ticket["status"]].discard(ticket_id)
+                self._tickets_by_status[status].add(ticket_id)
                 ticket["status"] = status
-                ticket["updated_at"] = datetime.utcnow().isoformat()
+                ticket["updated_at"] = now
                 
                 if resolution:
                     ticket["resolution"] = resolution
-                    ticket["resolved_at"] = datetime.utcnow().isoformat()
+                    ticket["resolved_at"] = now
                 
                 # Update database
                 # await self.db.execute("UPDATE tickets SET ... WHERE ticket_id = $1", ticket_id)
@@ -394,22 +551,50 @@ class DatabaseService:
             logger.error(f"Failed to update ticket: {e}")
             raise
     
+    def is_call_active(self, call_sid: str) -> bool:
+        """
+        Check whether a call has been started and not yet ended
+        
+        Args:
+            call_sid: Twilio Call SID
+            
+        Returns:
+            True while the call record is in progress
+        """
+        return call_sid in self._active_calls
+    
+    @property
+    def active_calls_count(self) -> int:
+        """Get count of active calls from the in-process index, without a coroutine"""
+        return len(self._active_calls)
+    
     async def get_active_calls_count(self) -> int:
         """Get count of active calls"""
         try:
             # Count from database
             # count = await self.db.fetchval("SELECT COUNT(*) FROM calls WHERE status = 'in-progress'")
             
-            count = sum(1 for call in self.calls_cache.values() if call["status"] == "in-progress")
-            return count
+            return self.active_calls_count
             
         except Exception as e:
             logger.error(f"Failed to get active calls count: {e}")
             return 0
     
     async def close(self):
-        """Close database connections"""
+        """Flush queued conversation entries and close database connections"""
         try:
+            if self._flusher:
+                self._flusher.cancel()
+                await asyncio.gather(self._flusher, return_exceptions=True)
+                self._flusher = None
+            
+            batch = []
+            while not self._log_queue.empty():
+                batch.append(self._log_queue.get_nowait())
+            
+            if batch:
+                await self._write_conversation_batch(batch)
+            
             # Close database pool
             # await self.db.close()
             logger.info("Database connections closed")
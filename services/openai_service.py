@@ -4,21 +4,40 @@ Handles connection and communication with OpenAI's realtime API
 """
 
 import asyncio
-import json
-from typing import Optional, Dict, Any, Callable
+import orjson
+from typing import Optional, Dict, Any, Callable, AsyncIterator
+from weakref import WeakValueDictionary
 from openai import AsyncOpenAI
-from config.agent_config import AGENT_CONFIG, AUDIO_CONFIG
+from websockets.exceptions import ConnectionClosedOK
+from config.agent_config import AGENT_CONFIG, get_session_update_event
 from utils.logger import get_logger
 
 logger = get_logger(__name__)
 
+# app.py batches decoded Twilio g711_ulaw frames and re-encodes each batch to base64;
+# only the audio field varies per append event
+AUDIO_APPEND_PREFIX = '{"type":"input_audio_buffer.append","audio":"'
+AUDIO_APPEND_SUFFIX = '"}'
+
+# Static client events, serialized once
+GREETING_EVENT = orjson.dumps({
+    "type": "response.create",
+    "response": {
+        "modalities": ["audio"],
+        "instructions": "Greet the customer warmly in Hinglish and ask how you can help them today."
+    }
+}).decode()
+RESPONSE_CREATE_EVENT = '{"type":"response.create"}'
+
 
 class OpenAIService:
     """Service for managing OpenAI Realtime API connections"""
     
     def __init__(self, api_key: str):
         self.client = AsyncOpenAI(api_key=api_key)
-        self.active_connections: Dict[str, Any] = {}
+        # Weak values, so a session torn down without close_session() drops out
+        # as soon as nothing else references its connection
+        self.active_connections: WeakValueDictionary = WeakValueDictionary()
     
     async def create_session(self, session_id: str) -> Any:
         """
@@ -33,8 +52,10 @@ class OpenAIService:
         try:
             logger.info(f"Creating OpenAI session: {session_id}")
             
+            # Audio frames are base64 and don't compress, so skip permessage-deflate
             connection = await self.client.beta.realtime.connect(
-                model=AGENT_CONFIG["model"]
+                model=AGENT_CONFIG["model"],
+                websocket_connection_options={"compression": None}
             )
             
             self.active_connections[session_id] = connection
@@ -47,6 +68,9 @@ class OpenAIService:
             
         except Exception as e:
             logger.error(f"Failed to create OpenAI session {session_id}: {e}")
+            
+            # The caller never gets the connection, so close it here
+            await self.close_session(session_id)
             raise
     
     async def configure_session(self, connection: Any):
@@ -57,22 +81,7 @@ class OpenAIService:
             connection: OpenAI WebSocket connection
         """
         try:
-            config = {
-                "type": "session.update",
-                "session": {
-                    "instructions": AGENT_CONFIG["instructions"],
-                    "voice": AGENT_CONFIG["voice"],
-                    "temperature": AGENT_CONFIG["temperature"],
-                    "tools": AGENT_CONFIG["tools"],
-                    "tool_choice": "auto",
-                    "input_audio_format": AUDIO_CONFIG["input_format"],
-                    "output_audio_format": AUDIO_CONFIG["output_format"],
-                    "turn_detection": AGENT_CONFIG["turn_detection"],
-                    "max_response_output_tokens": AGENT_CONFIG["max_response_output_tokens"]
-                }
-            }
-            
-            await connection.send(config)
+            await self._send_raw(connection, get_session_update_event())
             logger.debug("Session configuration sent")
             
         except Exception as e:
@@ -87,13 +96,7 @@ class OpenAIService:
             connection: OpenAI WebSocket connection
         """
         try:
-            await connection.send({
-                "type": "response.create",
-                "response": {
-                    "modalities": ["audio"],
-                    "instructions": "Greet the customer warmly in Hinglish and ask how you can help them today."
-                }
-            })
+            await self._send_raw(connection, GREETING_EVENT)
             logger.debug("Initial greeting sent")
             
         except Exception as e:
@@ -106,18 +109,42 @@ class OpenAIService:
         
         Args:
             connection: OpenAI WebSocket connection
-            audio_data: Base64 encoded audio data
+            audio_data: Base64 g711_ulaw batch (app.py decodes Twilio frames into a bytearray,
+                batches up to INBOUND_AUDIO_BATCH_BYTES and re-encodes)
         """
         try:
-            await connection.send({
-                "type": "input_audio_buffer.append",
-                "audio": audio_data
-            })
+            # Base64 needs no JSON escaping, so splice it straight into the frame
+            await self._send_raw(connection, AUDIO_APPEND_PREFIX + audio_data + AUDIO_APPEND_SUFFIX)
             
         except Exception as e:
             logger.error(f"Failed to send audio: {e}")
             raise
     
+    async def _send_raw(self, connection: Any, frame: str):
+        """
+        Send a pre-serialized event frame
+        
+        The SDK's send() transforms and json.dumps every event; this writes the
+        frame to the underlying WebSocket directly.
+        
+        Args:
+            connection: OpenAI WebSocket connection
+            frame: JSON-encoded client event
+        """
+        await connection._connection.send(frame)
+    
+    def is_closed(self, connection: Any) -> bool:
+        """
+        Check whether an OpenAI connection's WebSocket has closed
+        
+        Args:
+            connection: OpenAI WebSocket connection
+            
+        Returns:
+            True once the closing handshake has completed or the socket dropped
+        """
+        return connection._connection.close_code is not None
+    
     async def send_function_result(
         self,
         connection: Any,
@@ -133,17 +160,18 @@ class OpenAIService:
             result: Function execution result
         """
         try:
-            await connection.send({
+            await self._send_raw(connection, orjson.dumps({
                 "type": "conversation.item.create",
                 "item": {
                     "type": "function_call_output",
                     "call_id": call_id,
-                    "output": json.dumps(result)
+                    # Values orjson can't encode natively (e.g. Decimal prices from a DB row) go out as strings
+                    "output": orjson.dumps(result, default=str).decode()
                 }
-            })
+            }).decode())
             
             # Trigger response generation
-            await connection.send({"type": "response.create"})
+            await self._send_raw(connection, RESPONSE_CREATE_EVENT)
             
             logger.debug(f"Function result sent for call_id: {call_id}")
             
@@ -159,21 +187,35 @@ class OpenAIService:
             session_id: Session identifier
         """
         try:
-            if session_id in self.active_connections:
-                connection = self.active_connections[session_id]
-                
-                # Close the connection
-                if hasattr(connection, 'close'):
-                    await connection.close()
-                
-                # Remove from active connections
-                del self.active_connections[session_id]
-                
-                logger.info(f"OpenAI session closed: {session_id}")
-                
+            # Remove before awaiting close() so a concurrent close of the same session is a no-op
+            connection = self.active_connections.pop(session_id, None)
+            if connection is None:
+                return
+            
+            # Every connection comes from beta.realtime.connect(), which always has close()
+            await connection.close()
+            
+            logger.info(f"OpenAI session closed: {session_id}")
+            
         except Exception as e:
             logger.error(f"Error closing session {session_id}: {e}")
     
+    async def iter_raw_events(self, connection: Any) -> AsyncIterator[bytes]:
+        """
+        Iterate over raw OpenAI event frames without parsing them
+        
+        Args:
+            connection: OpenAI WebSocket connection
+            
+        Yields:
+            Raw JSON event frames
+        """
+        try:
+            while True:
+                yield await connection.recv_bytes()
+        except ConnectionClosedOK:
+            return
+    
     async def handle_event_stream(
         self,
         connection: Any,
@@ -182,12 +224,16 @@ class OpenAIService:
         """
         Handle incoming events from OpenAI
         
+        Frames are decoded with orjson rather than through the SDK's typed
+        event models, so handlers receive plain dicts keyed by "type".
+        
         Args:
             connection: OpenAI WebSocket connection
             event_handler: Async callback function to handle events
         """
         try:
-            async for event in connection:
+            async for raw_event in self.iter_raw_events(connection):
+                event = orjson.loads(raw_event)
                 try:
                     await event_handler(event)
                 except Exception as e:
@@ -3,19 +3,51 @@ Twilio Service
 Handles Twilio-specific operations like outbound calls, call management
 """
 
+import asyncio
 from typing import Optional, Dict
+from xml.sax.saxutils import escape
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from twilio.http.http_client import TwilioHttpClient
+from twilio.request_validator import RequestValidator
 from twilio.rest import Client
-from twilio.twiml.voice_response import VoiceResponse, Connect, Stream
+from models.call_session import TwilioCallRecord, SmsRecord
 from utils.logger import get_logger
 
 logger = get_logger(__name__)
 
+# REST client connection pool, sized for bursts of concurrent outbound calls
+TWILIO_HTTP_POOL_SIZE = 50
+TWILIO_HTTP_TIMEOUT = 10
+
+# Call progress events reported to the status callback for outbound calls
+STATUS_CALLBACK_EVENTS = ('initiated', 'ringing', 'answered', 'completed')
+
+# Same markup VoiceResponse/Connect/Stream would serialize; only attribute values vary per call
+CONNECT_TWIML_TEMPLATE = (
+    '<?xml version="1.0" encoding="UTF-8"?><Response><Connect>'
+    '<Stream url="{url}">'
+    '<Parameter name="callSid" value="{call_sid}" />'
+    '<Parameter name="from" value="{from_number}" />'
+    '</Stream></Connect></Response>'
+)
+XML_ATTR_ENTITIES = {'"': "&quot;"}
+
 
 class TwilioService:
     """Service for Twilio operations"""
     
     def __init__(self, account_sid: str, auth_token: str, phone_number: str):
-        self.client = Client(account_sid, auth_token)
+        # One keep-alive session for every REST call so requests reuse TLS connections;
+        # urllib3 only retries POSTs on connection errors, before anything was sent
+        http_client = TwilioHttpClient(timeout=TWILIO_HTTP_TIMEOUT)
+        http_client.session.mount("https://", HTTPAdapter(
+            pool_maxsize=TWILIO_HTTP_POOL_SIZE,
+            max_retries=Retry(total=3, backoff_factor=0.3)
+        ))
+        
+        self.client = Client(account_sid, auth_token, http_client=http_client)
+        self.validator = RequestValidator(auth_token)
         self.phone_number = phone_number
         self.account_sid = account_sid
     
@@ -32,18 +64,11 @@ class TwilioService:
             TwiML XML string
         """
         try:
-            response = VoiceResponse()
-            connect = Connect()
-            stream = Stream(url=stream_url)
-            
-            # Add parameters
-            stream.parameter(name='callSid', value=call_sid)
-            stream.parameter(name='from', value=from_number)
-            
-            connect.append(stream)
-            response.append(connect)
-            
-            twiml = str(response)
+            twiml = CONNECT_TWIML_TEMPLATE.format(
+                url=escape(stream_url, XML_ATTR_ENTITIES),
+                call_sid=escape(call_sid, XML_ATTR_ENTITIES),
+                from_number=escape(from_number, XML_ATTR_ENTITIES)
+            )
             logger.debug(f"Generated TwiML for call {call_sid}")
             
             return twiml
@@ -57,7 +82,7 @@ class TwilioService:
         to_number: str,
         webhook_url: str,
         context: Optional[Dict] = None
-    ) -> Dict:
+    ) -> TwilioCallRecord:
         """
         Initiate an outbound call
         
@@ -75,50 +100,52 @@ class TwilioService:
             # Create status callback URL with context if provided
             status_callback = f"{webhook_url}/call-status"
             
-            call = self.client.calls.create(
+            # The SDK is blocking; run it in a thread so audio streams keep flowing
+            call = await asyncio.to_thread(
+                self.client.calls.create,
                 to=to_number,
                 from_=self.phone_number,
                 url=webhook_url,
                 status_callback=status_callback,
-                status_callback_event=['initiated', 'ringing', 'answered', 'completed'],
+                status_callback_event=STATUS_CALLBACK_EVENTS,
                 method='POST'
             )
             
             logger.info(f"Outbound call created: {call.sid}")
             
-            return {
-                "call_sid": call.sid,
-                "status": call.status,
-                "to": to_number,
-                "from": self.phone_number
-            }
+            return TwilioCallRecord(
+                call_sid=call.sid,
+                status=call.status,
+                to_number=to_number,
+                from_number=self.phone_number
+            )
             
         except Exception as e:
             logger.error(f"Failed to initiate outbound call: {e}")
             raise
     
-    async def update_call_status(self, call_sid: str, status: str):
+    async def update_call_status(self, call_sid: str, status: str) -> TwilioCallRecord:
         """
         Update call status (e.g., cancel, complete)
         
         Args:
             call_sid: Twilio Call SID
             status: New status
+            
+        Returns:
+            Updated call status
         """
         try:
-            call = self.client.calls(call_sid).update(status=status)
+            call = await asyncio.to_thread(self.client.calls(call_sid).update, status=status)
             logger.info(f"Call {call_sid} updated to status: {status}")
             
-            return {
-                "call_sid": call_sid,
-                "status": call.status
-            }
+            return TwilioCallRecord(call_sid=call_sid, status=call.status)
             
         except Exception as e:
             logger.error(f"Failed to update call status: {e}")
             raise
     
-    async def get_call_details(self, call_sid: str) -> Dict:
+    async def get_call_details(self, call_sid: str) -> TwilioCallRecord:
         """
         Get details of a call
         
@@ -129,25 +156,25 @@ class TwilioService:
             Call details
         """
         try:
-            call = self.client.calls(call_sid).fetch()
-            
-            return {
-                "call_sid": call.sid,
-                "from": call.from_formatted,
-                "to": call.to_formatted,
-                "status": call.status,
-                "duration": call.duration,
-                "start_time": str(call.start_time) if call.start_time else None,
-                "end_time": str(call.end_time) if call.end_time else None,
-                "price": call.price,
-                "direction": call.direction
-            }
+            call = await asyncio.to_thread(self.client.calls(call_sid).fetch)
+            
+            return TwilioCallRecord(
+                call_sid=call.sid,
+                from_number=call.from_formatted,
+                to_number=call.to_formatted,
+                status=call.status,
+                duration=call.duration,
+                start_time=str(call.start_time) if call.start_time else None,
+                end_time=str(call.end_time) if call.end_time else None,
+                price=call.price,
+                direction=call.direction
+            )
             
         except Exception as e:
             logger.error(f"Failed to get call details: {e}")
             raise
     
-    async def transfer_call(self, call_sid: str, transfer_url: str) -> Dict:
+    async def transfer_call(self, call_sid: str, transfer_url: str) -> TwilioCallRecord:
         """
         Transfer call to another URL (e.g., human agent)
         
@@ -161,16 +188,13 @@ class TwilioService:
         try:
             logger.info(f"Transferring call {call_sid} to {transfer_url}")
             
-            call = self.client.calls(call_sid).update(
+            call = await asyncio.to_thread(
+                self.client.calls(call_sid).update,
                 url=transfer_url,
                 method='POST'
             )
             
-            return {
-                "call_sid": call_sid,
-                "status": "transferred",
-                "new_url": transfer_url
-            }
+            return TwilioCallRecord(call_sid=call_sid, status="transferred", url=transfer_url)
             
         except Exception as e:
             logger.error(f"Failed to transfer call: {e}")
@@ -193,17 +217,14 @@ class TwilioService:
         Returns:
             True if valid, False otherwise
         """
-        from twilio.request_validator import RequestValidator
-        
         try:
-            validator = RequestValidator(self.client.auth[1])
-            return validator.validate(url, params, signature)
+            return self.validator.validate(url, params, signature)
             
         except Exception as e:
             logger.error(f"Signature validation error: {e}")
             return False
     
-    async def send_sms(self, to_number: str, message: str) -> Dict:
+    async def send_sms(self, to_number: str, message: str) -> SmsRecord:
         """
         Send SMS message
         
@@ -215,7 +236,8 @@ class TwilioService:
             Message details
         """
         try:
-            message = self.client.messages.create(
+            message = await asyncio.to_thread(
+                self.client.messages.create,
                 to=to_number,
                 from_=self.phone_number,
                 body=message
@@ -223,11 +245,7 @@ class TwilioService:
             
             logger.info(f"SMS sent to {to_number}: {message.sid}")
             
-            return {
-                "message_sid": message.sid,
-                "status": message.status,
-                "to": to_number
-            }
+            return SmsRecord(message_sid=message.sid, status=message.status, to_number=to_number)
             
         except Exception as e:
             logger.error(f"Failed to send SMS: {e}")
@@ -3,14 +3,80 @@ Helper Utilities
 Various helper functions for the application
 """
 
+import asyncio
+import functools
+import os
+import random
 import re
 import hashlib
-import secrets
-from typing import Optional, Dict, Any
+import time
+from typing import Optional, Dict, Any, Tuple, Type
 from datetime import datetime, timedelta
-import base64
 
+# Compiled once at import; the helpers run on every transcript turn
+NON_DIGIT_RE = re.compile(r'\D')
+DIGIT_RE = re.compile(r'\d')
+EMAIL_RE = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
 
+# Entity patterns for parse_hinglish_input. Kept separate rather than fused into
+# one alternation: the same digits can be an order ID, a phone number and a pincode
+ORDER_ID_RES = (
+    re.compile(r'\b[A-Z]{2,}\d{4,}\b', re.IGNORECASE),  # ABC1234
+    re.compile(r'\b\d{6,}\b'),  # 123456
+    re.compile(r'\border[_\s-]?id[:\s]*([A-Za-z0-9]+)\b', re.IGNORECASE)  # order id: ABC123
+)
+PHONE_NUMBER_RE = re.compile(r'\b(?:\+91)?[6-9]\d{9}\b')
+EMAIL_IN_TEXT_RE = re.compile(r'\b[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}\b')
+PINCODE_RE = re.compile(r'\b[1-9]\d{5}\b')
+
+# Script detection for detect_language
+DEVANAGARI_RE = re.compile(r'[\u0900-\u097F]')
+ENGLISH_WORD_RE = re.compile(r'\b[a-zA-Z]+\b')
+DETECT_LANGUAGE_CACHE_MAX_LEN = 256
+
+# hash_identifier key when no salt is given; the keyed state is copied per call
+# so the key block is only compressed once
+DEFAULT_HASH_SALT = b"voice_agent_default_salt"
+DEFAULT_HASHER = hashlib.blake2b(key=DEFAULT_HASH_SALT, digest_size=8)
+
+# Every ASCII byte except 0-9, for bytes.translate deletion
+ASCII_NON_DIGITS = bytes(c for c in range(128) if not 0x30 <= c <= 0x39)
+
+# Indian mobile numbers start with one of these digits
+INDIAN_MOBILE_PREFIXES = frozenset('6789')
+
+# Call cost estimates (adjust based on actual rates)
+OPENAI_COST_PER_MIN = 0.24  # $0.24 per minute
+TWILIO_COST_PER_MIN = 0.01  # $0.01 per minute
+USD_TO_INR = 83.0  # Approx USD to INR
+
+# is_business_hours answers for the default 9:00-18:00 window, indexed by hour
+DEFAULT_BUSINESS_HOURS = tuple(9 <= hour < 18 for hour in range(24))
+
+# Timestamp strings are formatted once per UTC second and reused until it changes;
+# shared by ID generation, database records and JSON logs. One (second, iso, stamp) tuple
+# assigned in a single statement, so threads formatting different seconds never mix fields
+_cached_time = (-1, "", "")
+
+
+def strip_non_digits(text: str) -> str:
+    """
+    Remove all non-digit characters
+    
+    Args:
+        text: Input text
+        
+    Returns:
+        Digits only
+    """
+    # ASCII input (the usual case) is one C-level byte sweep; anything else keeps regex semantics
+    if text.isascii():
+        return text.encode().translate(None, ASCII_NON_DIGITS).decode()
+    return NON_DIGIT_RE.sub('', text)
+
+
+# The same caller IDs are sanitized again and again across webhooks and call turns
+@functools.lru_cache(maxsize=8192)
 def sanitize_phone_number(phone: str) -> str:
     """
     Sanitize and format phone number
@@ -22,13 +88,13 @@ def sanitize_phone_number(phone: str) -> str:
         Sanitized phone number
     """
     # Remove all non-digit characters
-    digits = re.sub(r'\D', '', phone)
+    digits = strip_non_digits(phone)
     
     # Add country code if missing (assuming India +91)
-    if not digits.startswith('91') and len(digits) == 10:
-        digits = '91' + digits
+    if len(digits) == 10 and not digits.startswith('91'):
+        return f"+91{digits}"
     
-    return '+' + digits
+    return f"+{digits}"
 
 
 def validate_email(email: str) -> bool:
@@ -41,8 +107,7 @@ def validate_email(email: str) -> bool:
     Returns:
         True if valid, False otherwise
     """
-    pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-    return bool(re.match(pattern, email))
+    return EMAIL_RE.match(email) is not None
 
 
 def validate_indian_phone(phone: str) -> bool:
@@ -56,17 +121,66 @@ def validate_indian_phone(phone: str) -> bool:
         True if valid Indian number
     """
     # Remove all non-digit characters
-    digits = re.sub(r'\D', '', phone)
+    digits = strip_non_digits(phone)
     
     # Should be 10 digits or 12 digits with country code
     if len(digits) == 10:
-        return digits[0] in ['6', '7', '8', '9']
+        return digits[0] in INDIAN_MOBILE_PREFIXES
     elif len(digits) == 12:
-        return digits.startswith('91') and digits[2] in ['6', '7', '8', '9']
+        return digits.startswith('91') and digits[2] in INDIAN_MOBILE_PREFIXES
     
     return False
 
 
+def _tick(now: float) -> Tuple[int, str, str]:
+    """
+    Get the cached timestamp strings for a time, refreshing them if the UTC second differs
+    
+    Args:
+        now: Epoch seconds
+        
+    Returns:
+        (second, YYYY-MM-DDTHH:MM:SS, YYYYMMDDHHMMSS) for that second
+    """
+    global _cached_time
+    cached = _cached_time
+    second = int(now)
+    if second != cached[0]:
+        parts = time.gmtime(second)
+        cached = (second, time.strftime("%Y-%m-%dT%H:%M:%S", parts), time.strftime("%Y%m%d%H%M%S", parts))
+        _cached_time = cached
+    return cached
+
+
+def utc_isoformat(now: Optional[float] = None) -> str:
+    """
+    Format a UTC time like datetime.utcnow().isoformat()
+    
+    Args:
+        now: Epoch seconds (defaults to the current time)
+        
+    Returns:
+        UTC timestamp with microseconds
+    """
+    if now is None:
+        now = time.time()
+    second, iso, _ = _tick(now)
+    return f"{iso}.{int((now - second) * 1_000_000):06d}"
+
+
+def utc_stamp(now: Optional[float] = None) -> str:
+    """
+    Format a UTC time as YYYYMMDDHHMMSS
+    
+    Args:
+        now: Epoch seconds (defaults to the current time)
+        
+    Returns:
+        Compact UTC timestamp
+    """
+    return _tick(time.time() if now is None else now)[2]
+
+
 def generate_session_id(prefix: str = "sess") -> str:
     """
     Generate unique session ID
@@ -77,8 +191,8 @@ def generate_session_id(prefix: str = "sess") -> str:
     Returns:
         Unique session ID
     """
-    timestamp = datetime.utcnow().strftime('%Y%m%d%H%M%S')
-    random_part = secrets.token_hex(4)
+    timestamp = utc_stamp()
+    random_part = os.urandom(4).hex()
     return f"{prefix}_{timestamp}_{random_part}"
 
 
@@ -92,8 +206,8 @@ def generate_ticket_id(ticket_type: str = "TKT") -> str:
     Returns:
         Unique ticket ID
     """
-    timestamp = datetime.utcnow().strftime('%Y%m%d%H%M%S')
-    random_part = secrets.token_hex(2).upper()
+    timestamp = utc_stamp()
+    random_part = os.urandom(2).hex().upper()
     return f"{ticket_type}-{timestamp}-{random_part}"
 
 
@@ -151,28 +265,24 @@ def parse_hinglish_input(text: str) -> Dict[str, Any]:
         "pincodes": []
     }
     
-    # Extract order IDs (various formats)
-    order_patterns = [
-        r'\b[A-Z]{2,}\d{4,}\b',  # ABC1234
-        r'\b\d{6,}\b',            # 123456
-        r'\border[_\s-]?id[:\s]*([A-Za-z0-9]+)\b'  # order id: ABC123
-    ]
+    # Most spoken turns have no digits or "@"; one early-exit search each
+    # rules out the scans that can't match
+    has_digits = DIGIT_RE.search(text) is not None
     
-    for pattern in order_patterns:
-        matches = re.findall(pattern, text, re.IGNORECASE)
-        result["order_ids"].extend(matches)
+    # Extract order IDs (various formats); only "order id: X" can match without digits
+    for pattern in (ORDER_ID_RES if has_digits else ORDER_ID_RES[-1:]):
+        result["order_ids"].extend(pattern.findall(text))
     
-    # Extract phone numbers
-    phone_pattern = r'\b(?:\+91)?[6-9]\d{9}\b'
-    result["phone_numbers"] = re.findall(phone_pattern, text)
+    if has_digits:
+        # Extract phone numbers
+        result["phone_numbers"] = PHONE_NUMBER_RE.findall(text)
+        
+        # Extract pincodes
+        result["pincodes"] = PINCODE_RE.findall(text)
     
     # Extract emails
-    email_pattern = r'\b[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}\b'
-    result["emails"] = re.findall(email_pattern, text)
-    
-    # Extract pincodes
-    pincode_pattern = r'\b[1-9]\d{5}\b'
-    result["pincodes"] = re.findall(pincode_pattern, text)
+    if "@" in text:
+        result["emails"] = EMAIL_IN_TEXT_RE.findall(text)
     
     return result
 
@@ -187,27 +297,39 @@ def detect_language(text: str) -> str:
     Returns:
         Language code (en, hi, hinglish)
     """
-    # Check for Devanagari script (Hindi)
-    hindi_chars = len(re.findall(r'[\u0900-\u097F]', text))
-    
-    # Check for English
-    english_words = len(re.findall(r'\b[a-zA-Z]+\b', text))
-    
+    # Short utterances ("haan", "ok", "theek hai") repeat constantly; long transcripts
+    # are classified directly so they don't fill the cache
+    if len(text) < DETECT_LANGUAGE_CACHE_MAX_LEN:
+        return _detect_language_cached(text)
+    return _detect_language(text)
+
+
+def _detect_language(text: str) -> str:
+    """Classify text by its share of Devanagari characters and English words"""
     total_chars = len(text.strip())
     
     if total_chars == 0:
         return "unknown"
     
-    hindi_ratio = hindi_chars / total_chars
+    # ASCII text (English or romanized Hinglish) has no Devanagari to count
+    if text.isascii():
+        return "en"
+    
+    # Check for Devanagari script (Hindi)
+    hindi_ratio = len(DEVANAGARI_RE.findall(text)) / total_chars
     
     if hindi_ratio > 0.7:
         return "hi"
-    elif hindi_ratio > 0.1 and english_words > 0:
+    # Only the presence of an English word matters, so the scan stops at the first one
+    elif hindi_ratio > 0.1 and ENGLISH_WORD_RE.search(text):
         return "hinglish"
     else:
         return "en"
 
 
+_detect_language_cached = functools.lru_cache(maxsize=4096)(_detect_language)
+
+
 def mask_sensitive_data(data: str, data_type: str = "phone") -> str:
     """
     Mask sensitive data for logging
@@ -219,25 +341,26 @@ def mask_sensitive_data(data: str, data_type: str = "phone") -> str:
     Returns:
         Masked data
     """
+    # rjust/ljust pad with "*" in a single allocation
     if data_type == "phone":
         # Show last 4 digits only
         if len(data) > 4:
-            return "*" * (len(data) - 4) + data[-4:]
+            return data[-4:].rjust(len(data), "*")
         return "****"
     
     elif data_type == "email":
         # Mask username part
         if '@' in data:
             username, domain = data.split('@', 1)
-            masked_username = username[0] + "*" * (len(username) - 1)
+            masked_username = username[:1].ljust(len(username), "*")
             return f"{masked_username}@{domain}"
         return "***@***.com"
     
     elif data_type == "card":
         # Show last 4 digits only
-        digits = re.sub(r'\D', '', data)
+        digits = strip_non_digits(data)
         if len(digits) > 4:
-            return "*" * (len(digits) - 4) + digits[-4:]
+            return digits[-4:].rjust(len(digits), "*")
         return "****"
     
     return "****"
@@ -249,16 +372,19 @@ def hash_identifier(identifier: str, salt: Optional[str] = None) -> str:
     
     Args:
         identifier: Original identifier
-        salt: Optional salt for hashing
+        salt: Optional salt for hashing, used as the BLAKE2b key (truncated to 64 bytes)
         
     Returns:
-        Hashed identifier
+        Hashed identifier (16 hex characters)
     """
+    # Keyed BLAKE2b sized to the 16-character token directly; no concat or truncation
     if salt is None:
-        salt = "voice_agent_default_salt"
+        hasher = DEFAULT_HASHER.copy()
+        hasher.update(identifier.encode())
+        return hasher.hexdigest()
     
-    combined = f"{identifier}{salt}"
-    return hashlib.sha256(combined.encode()).hexdigest()[:16]
+    # BLAKE2b keys are capped at 64 bytes
+    return hashlib.blake2b(identifier.encode(), key=salt.encode()[:64], digest_size=8).hexdigest()
 
 
 def truncate_text(text: str, max_length: int = 100, suffix: str = "...") -> str:
@@ -291,12 +417,8 @@ def estimate_call_cost(duration_seconds: float) -> Dict[str, float]:
     """
     duration_minutes = duration_seconds / 60
     
-    # Cost estimates (adjust based on actual rates)
-    openai_cost_per_min = 0.24  # $0.24 per minute
-    twilio_cost_per_min = 0.01  # $0.01 per minute
-    
-    openai_cost = duration_minutes * openai_cost_per_min
-    twilio_cost = duration_minutes * twilio_cost_per_min
+    openai_cost = duration_minutes * OPENAI_COST_PER_MIN
+    twilio_cost = duration_minutes * TWILIO_COST_PER_MIN
     total_cost = openai_cost + twilio_cost
     
     return {
@@ -304,7 +426,7 @@ def estimate_call_cost(duration_seconds: float) -> Dict[str, float]:
         "openai_cost_usd": round(openai_cost, 4),
         "twilio_cost_usd": round(twilio_cost, 4),
         "total_cost_usd": round(total_cost, 4),
-        "total_cost_inr": round(total_cost * 83, 2)  # Approx USD to INR
+        "total_cost_inr": round(total_cost * USD_TO_INR, 2)
     }
 
 
@@ -328,19 +450,26 @@ def is_business_hours(
         current_time = datetime.now()
     
     current_hour = current_time.hour
+    if start_hour == 9 and end_hour == 18:
+        return DEFAULT_BUSINESS_HOURS[current_hour]
     return start_hour <= current_hour < end_hour
 
 
-def retry_with_backoff(max_retries: int = 3, base_delay: float = 1.0):
+def retry_with_backoff(
+    max_retries: int = 3,
+    base_delay: float = 1.0,
+    retry_on: Tuple[Type[BaseException], ...] = (ConnectionError, TimeoutError)
+):
     """
     Decorator for retrying functions with exponential backoff
     
     Args:
         max_retries: Maximum number of retries
         base_delay: Base delay in seconds
+        retry_on: Transient exception types worth retrying; anything else is raised at once
     """
-    import functools
-    import asyncio
+    # Backoff schedule is fixed per decoration
+    delays = tuple(base_delay * (2 ** attempt) for attempt in range(max_retries - 1))
     
     def decorator(func):
         @functools.wraps(func)
@@ -348,12 +477,12 @@ def retry_with_backoff(max_retries: int = 3, base_delay: float = 1.0):
             for attempt in range(max_retries):
                 try:
                     return await func(*args, **kwargs)
-                except Exception as e:
+                except retry_on:
                     if attempt == max_retries - 1:
                         raise
                     
-                    delay = base_delay * (2 ** attempt)
-                    await asyncio.sleep(delay)
+                    # Jitter (0.5x-1.5x) so calls that failed together don't retry in lockstep
+                    await asyncio.sleep(delays[attempt] * (0.5 + random.random()))
             
         return wrapper
     return decorator
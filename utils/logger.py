@@ -5,9 +5,9 @@ Sets up structured logging for the application
 
 import logging
 import sys
-from datetime import datetime
 from typing import Optional
-import json
+import orjson
+from utils.helpers import utc_isoformat
 
 
 class JSONFormatter(logging.Formatter):
@@ -15,10 +15,11 @@ class JSONFormatter(logging.Formatter):
     
     def format(self, record: logging.LogRecord) -> str:
         log_data = {
-            "timestamp": datetime.utcnow().isoformat(),
+            "timestamp": utc_isoformat(record.created),
             "level": record.levelname,
             "logger": record.name,
-            "message": record.getMessage(),
+            # Most calls pass a pre-built f-string with no args to interpolate
+            "message": record.getMessage() if record.args else str(record.msg),
             "module": record.module,
             "function": record.funcName,
             "line": record.lineno
@@ -35,7 +36,8 @@ class JSONFormatter(logging.Formatter):
         if hasattr(record, "session_id"):
             log_data["session_id"] = record.session_id
         
-        return json.dumps(log_data)
+        # Extra fields may hold arbitrary objects; fall back to str() rather than drop the line
+        return orjson.dumps(log_data, default=str).decode()
 
 
 def setup_logger(
@@ -97,8 +99,9 @@ def get_logger(name: str, level: Optional[str] = None) -> logging.Logger:
     
     if not logger.handlers:
         # Logger hasn't been set up yet
-        from config.settings import settings
-        log_level = level or settings.LOG_LEVEL
+        # Only LOG_LEVEL is needed here, so don't require the full settings at import
+        from config.settings import load_env
+        log_level = level or load_env().get("LOG_LEVEL", "INFO")
         return setup_logger(name, log_level)
     
     return logger
@@ -111,10 +114,9 @@ class CallLoggerAdapter(logging.LoggerAdapter):
         super().__init__(logger, {"call_sid": call_sid})
     
     def process(self, msg, kwargs):
-        # Add call_sid to extra fields
-        if "extra" not in kwargs:
-            kwargs["extra"] = {}
-        kwargs["extra"]["call_sid"] = self.extra["call_sid"]
+        # Add call_sid to extra fields; the adapter's own dict serves when the caller passes none
+        extra = kwargs.get("extra")
+        kwargs["extra"] = self.extra if extra is None else {**extra, **self.extra}
         return msg, kwargs
 
 